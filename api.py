@@ -3,14 +3,23 @@ from __future__ import annotations
 from typing import Any, Optional
 
 import pandas as pd
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 
 import services
+from strava import StravaRateLimited
 
 app = FastAPI(title="Ride Log API")
 
 
+@app.exception_handler(StravaRateLimited)
+async def strava_rate_limited(request: Request, exc: StravaRateLimited) -> JSONResponse:
+    # Any endpoint that reaches Strava (connect, status refresh, sync) can hit the app rate limit.
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after is not None else None
+    return JSONResponse(status_code=429, content={"detail": "Strava rate limit reached; try again later."}, headers=headers)
+
+
 class UserContext(BaseModel):
     user_id: str
     role: str
@@ -147,7 +156,10 @@ def post_strava_sync(payload: StravaSyncRequest) -> dict[str, Any]:
 
 @app.get("/strava/status")
 def get_strava_status(user_id: str, role: str, patient_id: int) -> dict[str, Any]:
-    status = services.get_strava_status(user_id, role, patient_id)
+    try:
+        status = services.get_strava_status(user_id, role, patient_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     return {
         "connected": status.connected,
         "auth_url": status.auth_url,
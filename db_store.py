@@ -19,9 +19,26 @@ Designed to be safe on Streamlit Cloud:
 
 from __future__ import annotations
 
+import json
+import logging
 import os
-import sqlite3
-from typing import Optional, Any, List, Tuple, Dict
+import re
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Any, List, Tuple, Dict, Iterable, Iterator, Set
+
+import numpy as np
+import pandas as pd
+
+try:
+    # pysqlite3-binary is a drop-in DB-API module bundling a current SQLite
+    # (RETURNING, newer planner) regardless of the interpreter's build.
+    import pysqlite3.dbapi2 as sqlite3
+except ImportError:
+    import sqlite3
 
 
 # -----------------------------
@@ -31,13 +48,188 @@ DB_DIR = os.environ.get("RIDELOG_DB_DIR", "data")
 DB_PATH = os.environ.get("RIDELOG_DB_PATH", os.path.join(DB_DIR, "ride_log.db"))
 
 
+# Lookups hit on most requests. Each SQL text has one shared definition here
+# instead of being repeated inline at every call site. Reuse of prepared statements
+# comes from get_conn's cached_statements=256: sqlite3 caches per connection, keyed
+# on SQL text, with room for twice the default 128 statements.
+_HOT_SQL: Dict[str, str] = {
+    "get_strava_tokens": """
+        SELECT access_token, refresh_token, expires_at, athlete_id, scope
+        FROM strava_tokens
+        WHERE patient_id = ?
+    """,
+    "get_exercise": """
+        SELECT id, name, category, laterality, implement, primary_muscles, notes
+        FROM exercises
+        WHERE id = ?
+    """,
+    "get_patient_profile": """
+        SELECT sex, dob, bodyweight_kg, presumed_level
+        FROM patient_profile
+        WHERE patient_id = ?
+    """,
+    "get_strength_estimate": """
+        SELECT as_of_date, estimated_1rm_kg, estimated_rel_1rm_bw,
+               level_used, sex_used, age_used, bw_used, method, notes
+        FROM strength_estimates
+        WHERE patient_id = ? AND exercise_id = ?
+    """,
+    "fetch_latest_sc_block": """
+        SELECT id, start_date, weeks, model, deload_week, sessions_per_week, goal, notes, created_at
+        FROM sc_blocks
+        WHERE patient_id = ?
+        ORDER BY id DESC
+        LIMIT 1
+    """,
+    "fetch_rides": """
+        SELECT ride_date, distance_km, duration_min, rpe, notes
+        FROM rides
+        WHERE patient_id = ?
+        ORDER BY ride_date DESC, id DESC
+    """,
+    "fetch_week_plans": """
+        SELECT week_start, planned_km, planned_hours, phase, notes
+        FROM weekly_plan
+        WHERE patient_id = ?
+        ORDER BY week_start ASC
+    """,
+    "is_activity_synced": """
+        SELECT 1
+        FROM strava_synced
+        WHERE patient_id = ? AND strava_activity_id = ?
+        LIMIT 1
+    """,
+    "get_norm_standard": """
+        SELECT poor, fair, good, excellent, source, notes, age_min, age_max
+        FROM norm_strength_standards
+        WHERE exercise_id = ?
+          AND sex = ?
+          AND metric = ?
+          AND age_min <= ?
+          AND age_max >= ?
+        ORDER BY age_min DESC
+        LIMIT 1
+    """,
+    "get_norm_tier": """
+        SELECT CASE
+                 WHEN ? < fair THEN 'poor'
+                 WHEN ? < good THEN 'fair'
+                 WHEN ? < excellent THEN 'good'
+                 ELSE 'excellent'
+               END
+        FROM norm_strength_standards
+        WHERE exercise_id = ?
+          AND sex = ?
+          AND metric = ?
+          AND age_min <= ?
+          AND age_max >= ?
+        ORDER BY age_min DESC
+        LIMIT 1
+    """,
+}
+
+
+# journal_mode=WAL is persistent in the DB file, so it only needs setting once per path.
+_WAL_ENABLED_PATHS: Set[str] = set()
+
+# UPSERT ... RETURNING needs SQLite >= 3.35; older builds use INSERT then SELECT id.
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+_RETURNING_ID = "RETURNING id" if _HAS_RETURNING else ""
+
+# STRICT tables need SQLite >= 3.37; older builds get the same DDL without it.
+_HAS_STRICT = sqlite3.sqlite_version_info >= (3, 37, 0)
+
+
+def _strict(ddl: str) -> str:
+    return ddl if _HAS_STRICT else re.sub(r"\)\s*(WITHOUT ROWID)?,?\s*STRICT", r") \1", ddl)
+
+
+# One long-lived connection per thread; helpers reuse it instead of reconnecting.
+_tls = threading.local()
+
+logger = logging.getLogger(__name__)
+
+# A daemon thread per DB path checkpoints the WAL and refreshes planner stats on this
+# interval. Foreground connections keep a large autocheckpoint only as a backstop, so
+# sustained writes or a long reader can't grow the WAL without bound.
+_MAINTENANCE_INTERVAL_SEC = 900
+_WAL_AUTOCHECKPOINT_PAGES = 10000
+_MAINTENANCE_PATHS: Set[str] = set()
+_MAINTENANCE_LOCK = threading.Lock()
+# The maintenance connection runs no app queries, so a plain PRAGMA optimize has nothing
+# to act on. From 3.46, mask 0x10000 makes it consider every table; older SQLite gets ANALYZE.
+_STATS_SQL = "PRAGMA optimize=0x10002;" if sqlite3.sqlite_version_info >= (3, 46, 0) else "ANALYZE;"
+
+
+def _maintenance_loop(db_path: str) -> None:
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    while True:
+        time.sleep(_MAINTENANCE_INTERVAL_SEC)
+        try:
+            busy, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE);").fetchone()
+            if busy or (wal_pages >= 0 and checkpointed < wal_pages):
+                logger.warning(
+                    "WAL checkpoint of %s incomplete (busy=%s, %s of %s pages checkpointed)",
+                    db_path, busy, checkpointed, wal_pages,
+                )
+            conn.execute(_STATS_SQL)
+        except sqlite3.Error as exc:
+            logger.warning("DB maintenance on %s failed: %s", db_path, exc)
+
+
+def _start_maintenance(db_path: str) -> None:
+    with _MAINTENANCE_LOCK:
+        if db_path in _MAINTENANCE_PATHS:
+            return
+        _MAINTENANCE_PATHS.add(db_path)
+    threading.Thread(
+        target=_maintenance_loop,
+        args=(db_path,),
+        name="ride-log-db-maintenance",
+        daemon=True,
+    ).start()
+
+
 def get_conn() -> sqlite3.Connection:
+    conn = getattr(_tls, "conn", None)
+    if conn is not None:
+        return conn
     os.makedirs(DB_DIR, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+    if DB_PATH not in _WAL_ENABLED_PATHS:
+        # WAL lets readers run alongside a writer.
+        conn.execute("PRAGMA journal_mode = WAL;")
+        _WAL_ENABLED_PATHS.add(DB_PATH)
     conn.execute("PRAGMA foreign_keys = ON;")
+    # NORMAL sync drops WAL commits to one fsync.
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute("PRAGMA cache_size = -20000;")
+    conn.execute("PRAGMA mmap_size = 268435456;")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {_WAL_AUTOCHECKPOINT_PAGES};")
+    conn.execute("PRAGMA busy_timeout = 5000;")
+    _tls.conn = conn
+    _start_maintenance(DB_PATH)
     return conn
 
 
+@contextmanager
+def _bulk_write() -> Iterator[sqlite3.Connection]:
+    """
+    Batched writes: take the write lock up front (BEGIN IMMEDIATE) rather than
+    upgrading a deferred transaction mid-batch, then commit once.
+    """
+    conn = get_conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
 def _table_columns(cur: sqlite3.Cursor, table_name: str) -> List[str]:
     cur.execute(f"PRAGMA table_info({table_name})")
     return [r[1] for r in cur.fetchall()]
@@ -76,16 +268,15 @@ def _patients_unique_on_name_exists(cur: sqlite3.Cursor) -> bool:
 
 def _rebuild_patients_table(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
-    cur.execute("PRAGMA foreign_keys=OFF")
     cur.execute("ALTER TABLE patients RENAME TO patients_old")
-    cur.execute("""
+    cur.execute(_strict("""
         CREATE TABLE patients (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             owner_user_id TEXT,
             created_at TEXT DEFAULT (datetime('now'))
-        )
-    """)
+        ) STRICT
+    """))
     old_cols = _table_columns(cur, "patients_old")
     owner_select = "owner_user_id" if "owner_user_id" in old_cols else "NULL AS owner_user_id"
     created_select = "created_at" if "created_at" in old_cols else "datetime('now') AS created_at"
@@ -95,346 +286,388 @@ def _rebuild_patients_table(conn: sqlite3.Connection) -> None:
         FROM patients_old
     """)
     cur.execute("DROP TABLE patients_old")
-    cur.execute("PRAGMA foreign_keys=ON")
-
-
-# -----------------------------
-# Init / migrations
-# -----------------------------
-def init_db() -> None:
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # -----------------------------
-    # Core tables
-    # -----------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS patients (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        owner_user_id TEXT,
-        created_at TEXT DEFAULT (datetime('now'))
-    )
-    """)
-
-    if _patients_unique_on_name_exists(cur):
-        _rebuild_patients_table(conn)
-        cur = conn.cursor()
-
-    _ensure_column(cur, "patients", "owner_user_id", "owner_user_id TEXT")
-
-    cur.execute("""
-    CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_owner_name_unique
-    ON patients(owner_user_id, name)
-    WHERE owner_user_id IS NOT NULL
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS user_roles (
-        user_id TEXT PRIMARY KEY,
-        role TEXT NOT NULL,
-        created_at TEXT DEFAULT (datetime('now'))
-    )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS organization_coaches (
-        owner_user_id TEXT NOT NULL,
-        coach_user_id TEXT NOT NULL,
-        created_at TEXT DEFAULT (datetime('now')),
-        PRIMARY KEY (owner_user_id, coach_user_id)
-    )
-    """)
-
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS organization_domains (
-        email_suffix TEXT PRIMARY KEY,
-        owner_user_id TEXT NOT NULL,
-        created_at TEXT DEFAULT (datetime('now'))
-    )
-    """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS coach_patient_access (
-        coach_user_id TEXT NOT NULL,
-        patient_id INTEGER NOT NULL,
-        created_at TEXT DEFAULT (datetime('now')),
-        PRIMARY KEY (coach_user_id, patient_id),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
-    """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS client_invites (
-        email TEXT PRIMARY KEY,
-        patient_id INTEGER NOT NULL,
-        coach_user_id TEXT NOT NULL,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+def _table_is_without_rowid(cur: sqlite3.Cursor, table_name: str) -> bool:
+    cur.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (table_name,),
     )
-    """)
+    row = cur.fetchone()
+    return row is not None and "WITHOUT ROWID" in str(row[0]).upper()
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS rides (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        patient_id INTEGER NOT NULL,
-        ride_date TEXT NOT NULL,              -- YYYY-MM-DD
-        distance_km REAL NOT NULL,
-        duration_min INTEGER NOT NULL,
-        rpe INTEGER,                          -- nullable
-        notes TEXT,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
-    """)
 
-    cur.execute("""
-    CREATE INDEX IF NOT EXISTS idx_rides_patient_date
-    ON rides(patient_id, ride_date)
-    """)
+def _run_table_rebuild(conn: sqlite3.Connection, rebuild) -> None:
+    """
+    Runs a table rebuild in its own transaction with foreign keys off. SQLite ignores
+    PRAGMA foreign_keys inside a transaction, so the toggle happens outside it and the
+    connection's previous setting is restored afterwards. legacy_alter_table stops the
+    RENAME from repointing other tables' REFERENCES at the soon-dropped *_old table.
+    """
+    conn.commit()
+    fk_enabled = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+    legacy_alter = conn.execute("PRAGMA legacy_alter_table").fetchone()[0]
+    conn.execute("PRAGMA foreign_keys=OFF")
+    conn.execute("PRAGMA legacy_alter_table=ON")
+    try:
+        conn.execute("BEGIN")
+        with conn:
+            rebuild(conn)
+    finally:
+        conn.execute(f"PRAGMA legacy_alter_table={'ON' if legacy_alter else 'OFF'}")
+        conn.execute(f"PRAGMA foreign_keys={'ON' if fk_enabled else 'OFF'}")
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS weekly_plan (
-        patient_id INTEGER NOT NULL,
-        week_start TEXT NOT NULL,             -- Monday YYYY-MM-DD
-        planned_km REAL,
-        planned_hours REAL,
-        phase TEXT,
-        notes TEXT,
-        updated_at TEXT DEFAULT (datetime('now')),
-        PRIMARY KEY (patient_id, week_start),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
-    """)
 
-    # -----------------------------
-    # Strava integration tables
-    # -----------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS strava_tokens (
-        patient_id INTEGER PRIMARY KEY,
-        access_token TEXT NOT NULL,
-        refresh_token TEXT NOT NULL,
-        expires_at INTEGER NOT NULL,          -- epoch seconds
-        athlete_id INTEGER,
-        scope TEXT,
-        updated_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
+def _rebuild_strava_synced_table(conn: sqlite3.Connection) -> None:
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE strava_synced RENAME TO strava_synced_old")
+    cur.execute(_strict("""
+        CREATE TABLE strava_synced (
+            patient_id INTEGER NOT NULL,
+            strava_activity_id INTEGER NOT NULL,
+            synced_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (patient_id, strava_activity_id),
+            FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+        ) WITHOUT ROWID, STRICT
+    """))
+    cur.execute("""
+        INSERT OR IGNORE INTO strava_synced(patient_id, strava_activity_id, synced_at)
+        SELECT patient_id, strava_activity_id, synced_at
+        FROM strava_synced_old
     """)
+    cur.execute("DROP TABLE strava_synced_old")
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS strava_synced (
-        patient_id INTEGER NOT NULL,
-        strava_activity_id INTEGER NOT NULL,
-        synced_at TEXT DEFAULT (datetime('now')),
-        PRIMARY KEY (patient_id, strava_activity_id),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
-    """)
 
-    # -----------------------------
-    # S&C library tables
-    # -----------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS exercises (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL UNIQUE,
-        category TEXT,                        -- squat/hinge/push/pull/ankle/core/conditioning/etc
-        laterality TEXT,                      -- bilateral/unilateral
-        implement TEXT,                       -- barbell/dumbbell/bodyweight/machine/band/etc
-        primary_muscles TEXT,
-        notes TEXT,
-        created_at TEXT DEFAULT (datetime('now'))
-    )
-    """)
+# -----------------------------
+# Init / migrations
+# -----------------------------
+_SCHEMA_SQL = """
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    owner_user_id TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS user_roles (
+    user_id TEXT PRIMARY KEY,
+    role TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now'))
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS organization_coaches (
+    owner_user_id TEXT NOT NULL,
+    coach_user_id TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (owner_user_id, coach_user_id)
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS organization_domains (
+    email_suffix TEXT PRIMARY KEY,
+    owner_user_id TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now'))
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS coach_patient_access (
+    coach_user_id TEXT NOT NULL,
+    patient_id INTEGER NOT NULL,
+    created_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (coach_user_id, patient_id),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS client_invites (
+    email TEXT PRIMARY KEY,
+    patient_id INTEGER NOT NULL,
+    coach_user_id TEXT NOT NULL,
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS rides (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    ride_date TEXT NOT NULL,              -- YYYY-MM-DD
+    distance_km REAL NOT NULL,
+    duration_min INTEGER NOT NULL,
+    rpe INTEGER,                          -- nullable
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE INDEX IF NOT EXISTS idx_rides_patient_date
+ON rides(patient_id, ride_date);
+
+CREATE TABLE IF NOT EXISTS weekly_plan (
+    patient_id INTEGER NOT NULL,
+    week_start TEXT NOT NULL,             -- Monday YYYY-MM-DD
+    planned_km REAL,
+    planned_hours REAL,
+    phase TEXT,
+    notes TEXT,
+    updated_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (patient_id, week_start),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS strava_tokens (
+    patient_id INTEGER PRIMARY KEY,
+    access_token TEXT NOT NULL,
+    refresh_token TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,          -- epoch seconds
+    athlete_id INTEGER,
+    scope TEXT,
+    updated_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS strava_synced (
+    patient_id INTEGER NOT NULL,
+    strava_activity_id INTEGER NOT NULL,
+    synced_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (patient_id, strava_activity_id),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) WITHOUT ROWID, STRICT;
+
+CREATE TABLE IF NOT EXISTS exercises (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE,
+    category TEXT,                        -- squat/hinge/push/pull/ankle/core/conditioning/etc
+    laterality TEXT,                      -- bilateral/unilateral
+    implement TEXT,                       -- barbell/dumbbell/bodyweight/machine/band/etc
+    primary_muscles TEXT,
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS rep_schemes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    goal TEXT NOT NULL,                   -- endurance/hypertrophy/strength/power
+    phase TEXT,                           -- base/build/peak etc
+    reps_min INTEGER NOT NULL,
+    reps_max INTEGER NOT NULL,
+    sets_min INTEGER NOT NULL,
+    sets_max INTEGER NOT NULL,
+    pct_1rm_min REAL,                     -- 0.00–1.00 (nullable for BW/isometric)
+    pct_1rm_max REAL,                     -- 0.00–1.00
+    rpe_min INTEGER,
+    rpe_max INTEGER,
+    rest_sec_min INTEGER,
+    rest_sec_max INTEGER,
+    intent TEXT,
+    created_at TEXT DEFAULT (datetime('now'))
+) STRICT;
+
+CREATE INDEX IF NOT EXISTS idx_rep_schemes_goal
+ON rep_schemes(goal);
+
+CREATE TABLE IF NOT EXISTS norm_strength_standards (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    exercise_id INTEGER NOT NULL,
+    sex TEXT NOT NULL,                    -- male/female
+    age_min INTEGER NOT NULL,
+    age_max INTEGER NOT NULL,
+    metric TEXT NOT NULL,                 -- rel_1rm_bw | pullup_reps
+    poor REAL NOT NULL,
+    fair REAL NOT NULL,
+    good REAL NOT NULL,
+    excellent REAL NOT NULL,
+    source TEXT,
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS patient_profile (
+    patient_id INTEGER PRIMARY KEY,
+    sex TEXT,                             -- 'male' | 'female'
+    dob TEXT,                             -- 'YYYY-MM-DD' optional
+    bodyweight_kg REAL,
+    presumed_level TEXT,                  -- 'novice' | 'intermediate' | 'advanced' | 'expert'
+    updated_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS strength_estimates (
+    patient_id INTEGER NOT NULL,
+    exercise_id INTEGER NOT NULL,
+    as_of_date TEXT NOT NULL,             -- YYYY-MM-DD
+    estimated_1rm_kg REAL,                -- null for pull-ups
+    estimated_rel_1rm_bw REAL,            -- ratio used (audit)
+    level_used TEXT NOT NULL,
+    sex_used TEXT NOT NULL,
+    age_used INTEGER NOT NULL,
+    bw_used REAL,                         -- can be null if unknown
+    method TEXT NOT NULL,                 -- 'norm_level_band_v1' etc
+    notes TEXT,
+    updated_at TEXT DEFAULT (datetime('now')),
+    PRIMARY KEY (patient_id, exercise_id),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE,
+    FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sc_blocks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL,
+    start_date TEXT NOT NULL,            -- YYYY-MM-DD (Mon recommended)
+    weeks INTEGER NOT NULL DEFAULT 6,
+    model TEXT NOT NULL,                 -- 'hybrid_v1'
+    deload_week INTEGER NOT NULL DEFAULT 4,
+    sessions_per_week INTEGER NOT NULL DEFAULT 2,
+    goal TEXT,                           -- endurance/hypertrophy/strength/power/hybrid
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sc_weeks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    block_id INTEGER NOT NULL,
+    week_no INTEGER NOT NULL,            -- 1..N
+    week_start TEXT NOT NULL,            -- YYYY-MM-DD
+    focus TEXT,                          -- capacity/hypertrophy/strength/power/deload/hybrid
+    deload_flag INTEGER NOT NULL DEFAULT 0,
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (block_id) REFERENCES sc_blocks(id) ON DELETE CASCADE,
+    UNIQUE(block_id, week_no)
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sc_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    week_id INTEGER NOT NULL,
+    session_label TEXT NOT NULL,         -- 'A' | 'B' | 'C' ...
+    day_hint TEXT,                       -- optional
+    notes TEXT,
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (week_id) REFERENCES sc_weeks(id) ON DELETE CASCADE,
+    UNIQUE(week_id, session_label)
+) STRICT;
+
+CREATE TABLE IF NOT EXISTS sc_session_exercises (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    exercise_id INTEGER NOT NULL,
+
+    -- targets (planned)
+    sets_target INTEGER NOT NULL,
+    reps_target INTEGER NOT NULL,
+    pct_1rm_target REAL,                 -- 0..1 nullable
+    load_kg_target REAL,                 -- nullable
+    rpe_target INTEGER,                  -- nullable
+    rest_sec_target INTEGER,             -- nullable
+    intent TEXT,
+    notes TEXT,
+
+    -- actuals
+    sets_actual INTEGER,
+    reps_actual INTEGER,
+    load_kg_actual REAL,
+    completed_flag INTEGER NOT NULL DEFAULT 0,
+    actual_notes TEXT,
+
+    created_at TEXT DEFAULT (datetime('now')),
+    FOREIGN KEY (session_id) REFERENCES sc_sessions(id) ON DELETE CASCADE,
+    FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
+) STRICT;
+
+COMMIT;
+"""
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS rep_schemes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        goal TEXT NOT NULL,                   -- endurance/hypertrophy/strength/power
-        phase TEXT,                           -- base/build/peak etc
-        reps_min INTEGER NOT NULL,
-        reps_max INTEGER NOT NULL,
-        sets_min INTEGER NOT NULL,
-        sets_max INTEGER NOT NULL,
-        pct_1rm_min REAL,                     -- 0.00–1.00 (nullable for BW/isometric)
-        pct_1rm_max REAL,                     -- 0.00–1.00
-        rpe_min INTEGER,
-        rpe_max INTEGER,
-        rest_sec_min INTEGER,
-        rest_sec_max INTEGER,
-        intent TEXT,
-        created_at TEXT DEFAULT (datetime('now'))
-    )
-    """)
 
-    cur.execute("""
-    CREATE INDEX IF NOT EXISTS idx_rep_schemes_goal
-    ON rep_schemes(goal)
-    """)
+def init_db() -> None:
+    conn = get_conn()
+    conn.executescript(_strict(_SCHEMA_SQL))
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS norm_strength_standards (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        exercise_id INTEGER NOT NULL,
-        sex TEXT NOT NULL,                    -- male/female
-        age_min INTEGER NOT NULL,
-        age_max INTEGER NOT NULL,
-        metric TEXT NOT NULL,                 -- rel_1rm_bw | pullup_reps
-        poor REAL NOT NULL,
-        fair REAL NOT NULL,
-        good REAL NOT NULL,
-        excellent REAL NOT NULL,
-        source TEXT,
-        notes TEXT,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
-    )
-    """)
+    if _patients_unique_on_name_exists(conn.cursor()):
+        _run_table_rebuild(conn, _rebuild_patients_table)
 
-    cur.execute("""
-    CREATE INDEX IF NOT EXISTS idx_norm_lookup
-    ON norm_strength_standards(exercise_id, sex, metric, age_min, age_max)
-    """)
+    # Safe migration: older DBs created strava_synced as a rowid table
+    if not _table_is_without_rowid(conn.cursor(), "strava_synced"):
+        _run_table_rebuild(conn, _rebuild_strava_synced_table)
 
-    # -----------------------------
-    # Patient profile (sex/dob/BW/level)
-    # -----------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS patient_profile (
-        patient_id INTEGER PRIMARY KEY,
-        sex TEXT,                             -- 'male' | 'female'
-        dob TEXT,                             -- 'YYYY-MM-DD' optional
-        bodyweight_kg REAL,
-        presumed_level TEXT,                  -- 'novice' | 'intermediate' | 'advanced' | 'expert'
-        updated_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
-    """)
+    # get_conn's connection is reused for the thread's lifetime, so a migration must never leave FKs off.
+    if conn.execute("PRAGMA foreign_keys").fetchone()[0] != 1:
+        raise RuntimeError("Foreign key enforcement was disabled during database migration.")
 
-    # Safe migration: add presumed_level if table existed without it
-    _ensure_column(cur, "patient_profile", "presumed_level", "presumed_level TEXT")
+    with conn:
+        cur = conn.cursor()
 
-    # -----------------------------
-    # Strength estimates (auto-estimated e1RM audit trail)
-    # -----------------------------
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS strength_estimates (
-        patient_id INTEGER NOT NULL,
-        exercise_id INTEGER NOT NULL,
-        as_of_date TEXT NOT NULL,             -- YYYY-MM-DD
-        estimated_1rm_kg REAL,                -- null for pull-ups
-        estimated_rel_1rm_bw REAL,            -- ratio used (audit)
-        level_used TEXT NOT NULL,
-        sex_used TEXT NOT NULL,
-        age_used INTEGER NOT NULL,
-        bw_used REAL,                         -- can be null if unknown
-        method TEXT NOT NULL,                 -- 'norm_level_band_v1' etc
-        notes TEXT,
-        updated_at TEXT DEFAULT (datetime('now')),
-        PRIMARY KEY (patient_id, exercise_id),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE,
-        FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
-    )
-    """)
+        _ensure_column(cur, "patients", "owner_user_id", "owner_user_id TEXT")
 
-    # =========================================================
-    # S&C Programming: blocks/weeks/sessions/exercises (+ actuals)
-    # =========================================================
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sc_blocks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        patient_id INTEGER NOT NULL,
-        start_date TEXT NOT NULL,            -- YYYY-MM-DD (Mon recommended)
-        weeks INTEGER NOT NULL DEFAULT 6,
-        model TEXT NOT NULL,                 -- 'hybrid_v1'
-        deload_week INTEGER NOT NULL DEFAULT 4,
-        sessions_per_week INTEGER NOT NULL DEFAULT 2,
-        goal TEXT,                           -- endurance/hypertrophy/strength/power/hybrid
-        notes TEXT,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
-    )
-    """)
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_owner_name_unique
+        ON patients(owner_user_id, name)
+        WHERE owner_user_id IS NOT NULL
+        """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sc_weeks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        block_id INTEGER NOT NULL,
-        week_no INTEGER NOT NULL,            -- 1..N
-        week_start TEXT NOT NULL,            -- YYYY-MM-DD
-        focus TEXT,                          -- capacity/hypertrophy/strength/power/deload/hybrid
-        deload_flag INTEGER NOT NULL DEFAULT 0,
-        notes TEXT,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (block_id) REFERENCES sc_blocks(id) ON DELETE CASCADE,
-        UNIQUE(block_id, week_no)
-    )
-    """)
+        # Safe migration: rebuild idx_norm_lookup with age_min DESC to match get_norm_standard's ORDER BY
+        cur.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = 'idx_norm_lookup'")
+        row = cur.fetchone()
+        if row is not None and "DESC" not in str(row[0]).upper():
+            cur.execute("DROP INDEX idx_norm_lookup")
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sc_sessions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        week_id INTEGER NOT NULL,
-        session_label TEXT NOT NULL,         -- 'A' | 'B' | 'C' ...
-        day_hint TEXT,                       -- optional
-        notes TEXT,
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (week_id) REFERENCES sc_weeks(id) ON DELETE CASCADE,
-        UNIQUE(week_id, session_label)
-    )
-    """)
+        cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_norm_lookup
+        ON norm_strength_standards(exercise_id, sex, metric, age_min DESC, age_max)
+        """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS sc_session_exercises (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        session_id INTEGER NOT NULL,
-        exercise_id INTEGER NOT NULL,
-
-        -- targets (planned)
-        sets_target INTEGER NOT NULL,
-        reps_target INTEGER NOT NULL,
-        pct_1rm_target REAL,                 -- 0..1 nullable
-        load_kg_target REAL,                 -- nullable
-        rpe_target INTEGER,                  -- nullable
-        rest_sec_target INTEGER,             -- nullable
-        intent TEXT,
-        notes TEXT,
-
-        -- actuals
-        sets_actual INTEGER,
-        reps_actual INTEGER,
-        load_kg_actual REAL,
-        completed_flag INTEGER NOT NULL DEFAULT 0,
-        actual_notes TEXT,
-
-        created_at TEXT DEFAULT (datetime('now')),
-        FOREIGN KEY (session_id) REFERENCES sc_sessions(id) ON DELETE CASCADE,
-        FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
-    )
-    """)
+        # Safe migration: drop duplicate bands (keep newest) before enforcing uniqueness
+        cur.execute("""
+        DELETE FROM norm_strength_standards
+        WHERE id NOT IN (
+            SELECT MAX(id)
+            FROM norm_strength_standards
+            GROUP BY exercise_id, sex, age_min, age_max, metric
+        )
+        """)
 
-    # Safe migrations if table existed before actual columns were added
-    cols = _table_columns(cur, "sc_session_exercises")
-    if "sets_target" not in cols:
-        # older schema support (if you had sets/reps columns)
-        # We do not auto-map legacy columns; we just add missing ones for forward compatibility.
-        _ensure_column(cur, "sc_session_exercises", "sets_target", "sets_target INTEGER NOT NULL DEFAULT 0")
-        _ensure_column(cur, "sc_session_exercises", "reps_target", "reps_target INTEGER NOT NULL DEFAULT 0")
-        _ensure_column(cur, "sc_session_exercises", "pct_1rm_target", "pct_1rm_target REAL")
-        _ensure_column(cur, "sc_session_exercises", "load_kg_target", "load_kg_target REAL")
-        _ensure_column(cur, "sc_session_exercises", "rpe_target", "rpe_target INTEGER")
-        _ensure_column(cur, "sc_session_exercises", "rest_sec_target", "rest_sec_target INTEGER")
-
-    _ensure_column(cur, "sc_session_exercises", "sets_actual", "sets_actual INTEGER")
-    _ensure_column(cur, "sc_session_exercises", "reps_actual", "reps_actual INTEGER")
-    _ensure_column(cur, "sc_session_exercises", "load_kg_actual", "load_kg_actual REAL")
-    _ensure_column(cur, "sc_session_exercises", "completed_flag", "completed_flag INTEGER NOT NULL DEFAULT 0")
-    _ensure_column(cur, "sc_session_exercises", "actual_notes", "actual_notes TEXT")
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_norm_standards
+        ON norm_strength_standards(exercise_id, sex, age_min, age_max, metric)
+        """)
+
+        # Safe migration: drop duplicate (goal, phase) schemes (keep oldest) before enforcing uniqueness.
+        # A UNIQUE index treats NULLs as distinct, so NULL and '' phases are keyed as one
+        # through COALESCE; the earlier plain (goal, phase) index is replaced.
+        cur.execute("DROP INDEX IF EXISTS uq_rep_schemes_goal_phase")
+        cur.execute("""
+        DELETE FROM rep_schemes
+        WHERE id NOT IN (
+            SELECT MIN(id)
+            FROM rep_schemes
+            GROUP BY goal, COALESCE(phase, '')
+        )
+        """)
 
-    conn.commit()
-    conn.close()
+        cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_rep_schemes_goal_phase_key
+        ON rep_schemes(goal, COALESCE(phase, ''))
+        """)
+
+        # Safe migration: add presumed_level if table existed without it
+        _ensure_column(cur, "patient_profile", "presumed_level", "presumed_level TEXT")
+
+        # Safe migrations if table existed before actual columns were added
+        cols = _table_columns(cur, "sc_session_exercises")
+        if "sets_target" not in cols:
+            # older schema support (if you had sets/reps columns)
+            # We do not auto-map legacy columns; we just add missing ones for forward compatibility.
+            _ensure_column(cur, "sc_session_exercises", "sets_target", "sets_target INTEGER NOT NULL DEFAULT 0")
+            _ensure_column(cur, "sc_session_exercises", "reps_target", "reps_target INTEGER NOT NULL DEFAULT 0")
+            _ensure_column(cur, "sc_session_exercises", "pct_1rm_target", "pct_1rm_target REAL")
+            _ensure_column(cur, "sc_session_exercises", "load_kg_target", "load_kg_target REAL")
+            _ensure_column(cur, "sc_session_exercises", "rpe_target", "rpe_target INTEGER")
+            _ensure_column(cur, "sc_session_exercises", "rest_sec_target", "rest_sec_target INTEGER")
+
+        _ensure_column(cur, "sc_session_exercises", "sets_actual", "sets_actual INTEGER")
+        _ensure_column(cur, "sc_session_exercises", "reps_actual", "reps_actual INTEGER")
+        _ensure_column(cur, "sc_session_exercises", "load_kg_actual", "load_kg_actual REAL")
+        _ensure_column(cur, "sc_session_exercises", "completed_flag", "completed_flag INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cur, "sc_session_exercises", "actual_notes", "actual_notes TEXT")
 
 
 # -----------------------------
@@ -442,172 +675,157 @@ def init_db() -> None:
 # -----------------------------
 def upsert_patient(name: str, owner_user_id: Optional[str] = None) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    if owner_user_id is not None:
-        cur.execute(
-            "SELECT id FROM patients WHERE name = ? AND owner_user_id = ?",
-            (name, owner_user_id),
-        )
-    else:
-        cur.execute(
-            "SELECT id FROM patients WHERE name = ? AND owner_user_id IS NULL",
-            (name,),
-        )
-    row = cur.fetchone()
-    if row is None:
-        cur.execute(
-            "INSERT INTO patients(name, owner_user_id) VALUES (?, ?)",
-            (name, owner_user_id),
-        )
-        pid = int(cur.lastrowid)
-    else:
-        pid = int(row[0])
-    conn.commit()
-    conn.close()
+    with conn:
+        cur = conn.cursor()
+        if owner_user_id is not None and _HAS_RETURNING:
+            cur.execute("""
+                INSERT INTO patients(name, owner_user_id)
+                VALUES (?, ?)
+                ON CONFLICT(owner_user_id, name) WHERE owner_user_id IS NOT NULL
+                DO UPDATE SET name=excluded.name
+                RETURNING id
+            """, (name, owner_user_id))
+            return int(cur.fetchone()[0])
+
+        if owner_user_id is not None:
+            cur.execute(
+                "SELECT id FROM patients WHERE name = ? AND owner_user_id = ?",
+                (name, owner_user_id),
+            )
+        else:
+            cur.execute(
+                "SELECT id FROM patients WHERE name = ? AND owner_user_id IS NULL",
+                (name,),
+            )
+        row = cur.fetchone()
+        if row is None:
+            cur.execute(
+                "INSERT INTO patients(name, owner_user_id) VALUES (?, ?)",
+                (name, owner_user_id),
+            )
+            pid = int(cur.lastrowid)
+        else:
+            pid = int(row[0])
     return pid
 
 
 def list_patients() -> List[Tuple[int, str]]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name FROM patients ORDER BY name ASC")
+    cur = conn.execute("SELECT id, name FROM patients ORDER BY name ASC")
     rows = cur.fetchall()
-    conn.close()
     return [(int(r[0]), str(r[1])) for r in rows]
 
 
 def get_user_role(user_id: str) -> Optional[str]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT role FROM user_roles WHERE user_id = ?", (user_id,))
+    cur = conn.execute("SELECT role FROM user_roles WHERE user_id = ?", (user_id,))
     row = cur.fetchone()
-    conn.close()
     return None if row is None else str(row[0])
 
 
 def upsert_user_role(user_id: str, role: str) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO user_roles(user_id, role)
-        VALUES (?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET
-            role=excluded.role
-    """, (user_id, role))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT INTO user_roles(user_id, role)
+            VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                role=excluded.role
+        """, (user_id, role))
 
 
 def add_coach_to_org(owner_user_id: str, coach_user_id: str) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT OR IGNORE INTO organization_coaches(owner_user_id, coach_user_id)
-        VALUES (?, ?)
-    """, (owner_user_id, coach_user_id))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT OR IGNORE INTO organization_coaches(owner_user_id, coach_user_id)
+            VALUES (?, ?)
+        """, (owner_user_id, coach_user_id))
 
 
 def get_owner_for_email_suffix(email_suffix: str) -> Optional[str]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
+    cur = conn.execute("""
         SELECT owner_user_id
         FROM organization_domains
         WHERE email_suffix = ?
         LIMIT 1
     """, (email_suffix.lower(),))
     row = cur.fetchone()
-    conn.close()
     return None if row is None else str(row[0])
 
 
 def register_owner_email_suffix(owner_user_id: str, email_suffix: str) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT OR IGNORE INTO organization_domains(email_suffix, owner_user_id)
-        VALUES (?, ?)
-    """, (email_suffix.lower(), owner_user_id))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT OR IGNORE INTO organization_domains(email_suffix, owner_user_id)
+            VALUES (?, ?)
+        """, (email_suffix.lower(), owner_user_id))
 
 
 def remove_coach_from_org(owner_user_id: str, coach_user_id: str) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        DELETE FROM organization_coaches
-        WHERE owner_user_id = ? AND coach_user_id = ?
-    """, (owner_user_id, coach_user_id))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            DELETE FROM organization_coaches
+            WHERE owner_user_id = ? AND coach_user_id = ?
+        """, (owner_user_id, coach_user_id))
 
 
 def list_org_coaches(owner_user_id: str) -> List[str]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
+    cur = conn.execute("""
         SELECT coach_user_id
         FROM organization_coaches
         WHERE owner_user_id = ?
         ORDER BY coach_user_id ASC
     """, (owner_user_id,))
     rows = cur.fetchall()
-    conn.close()
     return [str(r[0]) for r in rows]
 
 
 def assign_patient_to_coach(coach_user_id: str, patient_id: int) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT OR IGNORE INTO coach_patient_access(coach_user_id, patient_id)
-        VALUES (?, ?)
-    """, (coach_user_id, int(patient_id)))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT OR IGNORE INTO coach_patient_access(coach_user_id, patient_id)
+            VALUES (?, ?)
+        """, (coach_user_id, int(patient_id)))
 
 
 def set_patient_owner(patient_id: int, owner_user_id: str) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE patients
-        SET owner_user_id = ?
-        WHERE id = ?
-    """, (owner_user_id, int(patient_id)))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            UPDATE patients
+            SET owner_user_id = ?
+            WHERE id = ?
+        """, (owner_user_id, int(patient_id)))
 
 
 def create_client_invite(email: str, patient_id: int, coach_user_id: str) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO client_invites(email, patient_id, coach_user_id)
-        VALUES (?, ?, ?)
-        ON CONFLICT(email) DO UPDATE SET
-            patient_id=excluded.patient_id,
-            coach_user_id=excluded.coach_user_id,
-            created_at=datetime('now')
-    """, (email.lower(), int(patient_id), coach_user_id))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT INTO client_invites(email, patient_id, coach_user_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(email) DO UPDATE SET
+                patient_id=excluded.patient_id,
+                coach_user_id=excluded.coach_user_id,
+                created_at=datetime('now')
+        """, (email.lower(), int(patient_id), coach_user_id))
 
 
 def get_client_invite(email: str) -> Optional[Tuple[int, str]]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
+    cur = conn.execute("""
         SELECT patient_id, coach_user_id
         FROM client_invites
         WHERE email = ?
         LIMIT 1
     """, (email.lower(),))
     row = cur.fetchone()
-    conn.close()
     if row is None:
         return None
     return int(row[0]), str(row[1])
@@ -615,30 +833,28 @@ def get_client_invite(email: str) -> Optional[Tuple[int, str]]:
 
 def claim_client_invite(email: str, user_id: str) -> Optional[int]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT patient_id, coach_user_id
-        FROM client_invites
-        WHERE email = ?
-        LIMIT 1
-    """, (email.lower(),))
-    row = cur.fetchone()
-    if row is None:
-        conn.close()
-        return None
-    patient_id, coach_user_id = int(row[0]), str(row[1])
-    cur.execute("""
-        UPDATE patients
-        SET owner_user_id = ?
-        WHERE id = ? AND owner_user_id IS NULL
-    """, (user_id, patient_id))
-    cur.execute("""
-        INSERT OR IGNORE INTO coach_patient_access(coach_user_id, patient_id)
-        VALUES (?, ?)
-    """, (coach_user_id, patient_id))
-    cur.execute("DELETE FROM client_invites WHERE email = ?", (email.lower(),))
-    conn.commit()
-    conn.close()
+    with conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT patient_id, coach_user_id
+            FROM client_invites
+            WHERE email = ?
+            LIMIT 1
+        """, (email.lower(),))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        patient_id, coach_user_id = int(row[0]), str(row[1])
+        cur.execute("""
+            UPDATE patients
+            SET owner_user_id = ?
+            WHERE id = ? AND owner_user_id IS NULL
+        """, (user_id, patient_id))
+        cur.execute("""
+            INSERT OR IGNORE INTO coach_patient_access(coach_user_id, patient_id)
+            VALUES (?, ?)
+        """, (coach_user_id, patient_id))
+        cur.execute("DELETE FROM client_invites WHERE email = ?", (email.lower(),))
     return patient_id
 
 
@@ -671,38 +887,34 @@ def list_patients_for_user(user_id: str, role: str) -> List[Tuple[int, str]]:
             ORDER BY name ASC
         """, (user_id,))
     else:
-        conn.close()
         return []
     rows = cur.fetchall()
-    conn.close()
     return [(int(r[0]), str(r[1])) for r in rows]
 
 
+_ACCESS_ROLES = frozenset({"coach", "client", "super_admin"})
+# Owners always have access; coaches/clients also via coach_patient_access.
+# Shared by the sync and async access checks.
+_PATIENT_ACCESS_SQL = """
+    SELECT 1
+    FROM patients p
+    WHERE p.id = ?
+      AND (
+        p.owner_user_id = ?
+        OR (? != 'super_admin' AND EXISTS (
+            SELECT 1
+            FROM coach_patient_access cpa
+            WHERE cpa.coach_user_id = ? AND cpa.patient_id = p.id
+        ))
+      )
+    LIMIT 1
+"""
+
+
 def _user_can_access_patient(cur: sqlite3.Cursor, user_id: str, role: str, patient_id: int) -> bool:
-    if role not in {"coach", "client", "super_admin"}:
+    if role not in _ACCESS_ROLES:
         return False
-    if role == "super_admin":
-        cur.execute("""
-            SELECT 1
-            FROM patients
-            WHERE id = ? AND owner_user_id = ?
-            LIMIT 1
-        """, (int(patient_id), user_id))
-        return cur.fetchone() is not None
-    cur.execute("""
-        SELECT 1
-        FROM coach_patient_access
-        WHERE coach_user_id = ? AND patient_id = ?
-        LIMIT 1
-    """, (user_id, int(patient_id)))
-    if cur.fetchone() is not None:
-        return True
-    cur.execute("""
-        SELECT 1
-        FROM patients
-        WHERE id = ? AND owner_user_id = ?
-        LIMIT 1
-    """, (int(patient_id), user_id))
+    cur.execute(_PATIENT_ACCESS_SQL, (int(patient_id), user_id, role, user_id))
     return cur.fetchone() is not None
 
 
@@ -710,7 +922,6 @@ def _assert_patient_access(user_id: str, role: str, patient_id: int) -> None:
     conn = get_conn()
     cur = conn.cursor()
     ok = _user_can_access_patient(cur, user_id, role, patient_id)
-    conn.close()
     if not ok:
         raise PermissionError("User is not permitted to access this patient.")
 
@@ -720,6 +931,12 @@ def _assert_coach(role: str) -> None:
         raise PermissionError("User does not have coach permissions.")
 
 
+def _assert_coach_patient_access(user_id: str, role: str, patient_id: int) -> None:
+    # Role check first: non-coaches are rejected without opening a connection.
+    _assert_coach(role)
+    _assert_patient_access(user_id, role, patient_id)
+
+
 def _get_block_patient_id(cur: sqlite3.Cursor, block_id: int) -> Optional[int]:
     cur.execute("SELECT patient_id FROM sc_blocks WHERE id = ?", (int(block_id),))
     row = cur.fetchone()
@@ -767,10 +984,8 @@ def _assert_block_access(user_id: str, role: str, block_id: int) -> None:
     cur = conn.cursor()
     patient_id = _get_block_patient_id(cur, block_id)
     if patient_id is None:
-        conn.close()
         raise ValueError("Block not found.")
     ok = _user_can_access_patient(cur, user_id, role, patient_id)
-    conn.close()
     if not ok:
         raise PermissionError("User is not permitted to access this block.")
 
@@ -780,10 +995,8 @@ def _assert_week_access(user_id: str, role: str, week_id: int) -> None:
     cur = conn.cursor()
     patient_id = _get_week_patient_id(cur, week_id)
     if patient_id is None:
-        conn.close()
         raise ValueError("Week not found.")
     ok = _user_can_access_patient(cur, user_id, role, patient_id)
-    conn.close()
     if not ok:
         raise PermissionError("User is not permitted to access this week.")
 
@@ -793,10 +1006,8 @@ def _assert_session_access(user_id: str, role: str, session_id: int) -> None:
     cur = conn.cursor()
     patient_id = _get_session_patient_id(cur, session_id)
     if patient_id is None:
-        conn.close()
         raise ValueError("Session not found.")
     ok = _user_can_access_patient(cur, user_id, role, patient_id)
-    conn.close()
     if not ok:
         raise PermissionError("User is not permitted to access this session.")
 
@@ -815,6 +1026,27 @@ def add_ride_for_user(
     add_ride(patient_id, ride_date, distance_km, duration_min, rpe, notes)
 
 
+def bulk_add_rides_for_user(
+    user_id: str,
+    role: str,
+    patient_id: int,
+    rides: List[Tuple[str, float, int, Optional[int], Optional[str]]],
+) -> None:
+    _assert_patient_access(user_id, role, patient_id)
+    bulk_add_rides(patient_id, rides)
+
+
+def bulk_add_synced_rides_for_user(
+    user_id: str,
+    role: str,
+    patient_id: int,
+    rides: List[Tuple[str, float, int, Optional[int], Optional[str]]],
+    activity_ids: List[int],
+) -> None:
+    _assert_patient_access(user_id, role, patient_id)
+    bulk_add_synced_rides(patient_id, rides, activity_ids)
+
+
 def fetch_rides_for_user(
     user_id: str,
     role: str,
@@ -824,6 +1056,25 @@ def fetch_rides_for_user(
     return fetch_rides(patient_id)
 
 
+def fetch_rides_df_for_user(
+    user_id: str,
+    role: str,
+    patient_id: int,
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    _assert_patient_access(user_id, role, patient_id)
+    return fetch_rides_df(patient_id, limit)
+
+
+def fetch_weekly_summary_for_user(
+    user_id: str,
+    role: str,
+    patient_id: int,
+) -> List[Tuple[str, float, float, int]]:
+    _assert_patient_access(user_id, role, patient_id)
+    return fetch_weekly_summary(patient_id)
+
+
 def upsert_week_plan_for_user(
     user_id: str,
     role: str,
@@ -834,8 +1085,7 @@ def upsert_week_plan_for_user(
     phase: Optional[str],
     notes: Optional[str],
 ) -> None:
-    _assert_coach(role)
-    _assert_patient_access(user_id, role, patient_id)
+    _assert_coach_patient_access(user_id, role, patient_id)
     upsert_week_plan(patient_id, week_start, planned_km, planned_hours, phase, notes)
 
 
@@ -862,6 +1112,11 @@ def save_strava_tokens_for_user(
     save_strava_tokens(patient_id, access_token, refresh_token, expires_at, athlete_id, scope)
 
 
+def assert_patient_access_for_user(user_id: str, role: str, patient_id: int) -> None:
+    """Raises PermissionError unless the user may access the patient (one indexed query)."""
+    _assert_patient_access(user_id, role, patient_id)
+
+
 def get_strava_tokens_for_user(user_id: str, role: str, patient_id: int):
     _assert_patient_access(user_id, role, patient_id)
     return get_strava_tokens(patient_id)
@@ -877,6 +1132,21 @@ def is_activity_synced_for_user(user_id: str, role: str, patient_id: int, activi
     return is_activity_synced(patient_id, activity_id)
 
 
+def filter_unsynced_for_user(user_id: str, role: str, patient_id: int, activity_ids: List[int]) -> Set[int]:
+    _assert_patient_access(user_id, role, patient_id)
+    return filter_unsynced(patient_id, activity_ids)
+
+
+def mark_activities_synced_for_user(user_id: str, role: str, patient_id: int, activity_ids: List[int]) -> None:
+    _assert_patient_access(user_id, role, patient_id)
+    mark_activities_synced(patient_id, activity_ids)
+
+
+def fetch_synced_activity_ids_for_user(user_id: str, role: str, patient_id: int) -> Set[int]:
+    _assert_patient_access(user_id, role, patient_id)
+    return fetch_synced_activity_ids(patient_id)
+
+
 def upsert_patient_profile_for_user(
     user_id: str,
     role: str,
@@ -943,8 +1213,7 @@ def create_sc_block_for_user(
     deload_week: int = 4,
     sessions_per_week: int = 2,
 ) -> int:
-    _assert_coach(role)
-    _assert_patient_access(user_id, role, patient_id)
+    _assert_coach_patient_access(user_id, role, patient_id)
     return create_sc_block(
         patient_id=patient_id,
         start_date=start_date,
@@ -985,6 +1254,17 @@ def upsert_sc_session_for_user(
     return upsert_sc_session(week_id, session_label, day_hint, notes)
 
 
+def create_sc_block_weeks_and_sessions_for_user(
+    user_id: str,
+    role: str,
+    block_id: int,
+    weeks: List[Tuple[int, str, Optional[str], bool, List[str]]],
+) -> Dict[Tuple[int, str], int]:
+    _assert_coach(role)
+    _assert_block_access(user_id, role, block_id)
+    return create_sc_block_weeks_and_sessions(block_id, weeks)
+
+
 def clear_sc_session_exercises_for_user(user_id: str, role: str, session_id: int) -> None:
     _assert_coach(role)
     _assert_session_access(user_id, role, session_id)
@@ -1021,6 +1301,13 @@ def add_sc_session_exercise_for_user(
     )
 
 
+def bulk_add_sc_session_exercises_for_user(user_id: str, role: str, rows: List[Tuple]) -> None:
+    _assert_coach(role)
+    for session_id in {int(r[0]) for r in rows}:
+        _assert_session_access(user_id, role, session_id)
+    bulk_add_sc_session_exercises(rows)
+
+
 def update_sc_session_exercise_actual_for_user(
     user_id: str,
     role: str,
@@ -1031,14 +1318,54 @@ def update_sc_session_exercise_actual_for_user(
     completed_flag: bool,
     actual_notes: Optional[str],
 ) -> None:
+    # Access is enforced in the UPDATE itself (same rules as _user_can_access_patient):
+    # one statement on the happy path, lookups only to pick the error.
     conn = get_conn()
     cur = conn.cursor()
-    patient_id = _get_session_exercise_patient_id(cur, row_id)
-    conn.close()
-    if patient_id is None:
-        raise ValueError("Session exercise not found.")
-    _assert_patient_access(user_id, role, patient_id)
-    update_sc_session_exercise_actual(row_id, sets_actual, reps_actual, load_kg_actual, completed_flag, actual_notes)
+    updated = 0
+    if role in {"coach", "client", "super_admin"}:
+        with conn:
+            cur.execute("""
+                UPDATE sc_session_exercises
+                SET sets_actual=?,
+                    reps_actual=?,
+                    load_kg_actual=?,
+                    completed_flag=?,
+                    actual_notes=?
+                WHERE id = ?
+                  AND EXISTS (
+                    SELECT 1
+                    FROM sc_sessions s
+                    JOIN sc_weeks w ON w.id = s.week_id
+                    JOIN sc_blocks b ON b.id = w.block_id
+                    JOIN patients p ON p.id = b.patient_id
+                    WHERE s.id = sc_session_exercises.session_id
+                      AND (
+                        p.owner_user_id = ?
+                        OR (? != 'super_admin' AND EXISTS (
+                            SELECT 1
+                            FROM coach_patient_access cpa
+                            WHERE cpa.coach_user_id = ? AND cpa.patient_id = p.id
+                        ))
+                      )
+                  )
+            """, (
+                sets_actual,
+                reps_actual,
+                load_kg_actual,
+                1 if completed_flag else 0,
+                actual_notes,
+                int(row_id),
+                user_id,
+                role,
+                user_id,
+            ))
+            updated = cur.rowcount
+    if updated == 0:
+        patient_id = _get_session_exercise_patient_id(cur, row_id)
+        if patient_id is None:
+            raise ValueError("Session exercise not found.")
+        raise PermissionError("User is not permitted to access this patient.")
 
 
 def fetch_latest_sc_block_for_user(user_id: str, role: str, patient_id: int):
@@ -1063,27 +1390,112 @@ def add_ride(
     notes: Optional[str],
 ) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO rides(patient_id, ride_date, distance_km, duration_min, rpe, notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (int(patient_id), ride_date, float(distance_km), int(duration_min), rpe, notes))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT INTO rides(patient_id, ride_date, distance_km, duration_min, rpe, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (int(patient_id), ride_date, float(distance_km), int(duration_min), rpe, notes))
+
+
+def bulk_add_rides(
+    patient_id: int,
+    rides: Iterable[Tuple[str, float, int, Optional[int], Optional[str]]],
+) -> None:
+    """
+    rides: (ride_date, distance_km, duration_min, rpe, notes), inserted in one transaction.
+    """
+    pid = int(patient_id)
+    rows = [(pid, d, float(km), int(mins), rpe, notes) for d, km, mins, rpe, notes in rides]
+    if not rows:
+        return
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT INTO rides(patient_id, ride_date, distance_km, duration_min, rpe, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
+def bulk_add_synced_rides(
+    patient_id: int,
+    rides: Iterable[Tuple[str, float, int, Optional[int], Optional[str]]],
+    activity_ids: Iterable[int],
+) -> None:
+    """
+    Inserts imported rides and marks their source activities synced in one transaction,
+    so an interrupted sync cannot leave rides behind that would be re-imported.
+    """
+    pid = int(patient_id)
+    rows = [(pid, d, float(km), int(mins), rpe, notes) for d, km, mins, rpe, notes in rides]
+    synced = [(pid, int(a)) for a in activity_ids]
+    if not rows and not synced:
+        return
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT INTO rides(patient_id, ride_date, distance_km, duration_min, rpe, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.executemany("""
+            INSERT OR IGNORE INTO strava_synced(patient_id, strava_activity_id)
+            VALUES (?, ?)
+        """, synced)
+
+
+_FETCH_CHUNK_SIZE = 512
+
+
+def iter_rides(patient_id: int) -> Iterator[Tuple[str, float, int, Optional[int], Optional[str]]]:
+    """
+    Streams rides newest-first in chunks, so aggregate-only callers
+    never hold the full ride history in memory.
+    """
+    conn = get_conn()
+    cur = conn.execute(_HOT_SQL["fetch_rides"], (int(patient_id),))
+    while True:
+        chunk = cur.fetchmany(_FETCH_CHUNK_SIZE)
+        if not chunk:
+            break
+        # Column affinities already yield (str, float, int, int|None, str|None).
+        yield from chunk
 
 
 def fetch_rides(patient_id: int) -> List[Tuple[str, float, int, Optional[int], Optional[str]]]:
+    return list(iter_rides(patient_id))
+
+
+def fetch_rides_df(patient_id: int, limit: Optional[int] = None) -> pd.DataFrame:
+    """
+    Rides newest-first as a typed DataFrame (ride_date parsed to datetime64),
+    read straight from the cursor without an intermediate list of tuples.
+    """
+    conn = get_conn()
+    with warnings.catch_warnings():
+        # pandas warns on any DB-API connection that is not stdlib sqlite3 (e.g. pysqlite3).
+        warnings.filterwarnings("ignore", message="pandas only supports SQLAlchemy", category=UserWarning)
+        return pd.read_sql_query(
+            _HOT_SQL["fetch_rides"] + " LIMIT ?",
+            conn,
+            params=(int(patient_id), -1 if limit is None else int(limit)),
+            parse_dates=["ride_date"],
+        )
+
+
+def fetch_weekly_summary(patient_id: int) -> List[Tuple[str, float, float, int]]:
+    """
+    Weekly ride totals aggregated in SQLite (Monday week_start), oldest first:
+      (week_start, actual_km, actual_hours, rides_count)
+    """
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT ride_date, distance_km, duration_min, rpe, notes
+    cur = conn.execute("""
+        SELECT date(ride_date, 'weekday 0', '-6 days') AS week_start,
+               SUM(CAST(ROUND(distance_km * 1000) AS INTEGER)) / 1000.0 AS actual_km,
+               SUM(duration_min) / 60.0 AS actual_hours,
+               COUNT(*) AS rides_count
         FROM rides
         WHERE patient_id = ?
-        ORDER BY ride_date DESC, id DESC
+        GROUP BY week_start
+        ORDER BY week_start ASC
     """, (int(patient_id),))
-    rows = cur.fetchall()
-    conn.close()
-    return [(str(r[0]), float(r[1]), int(r[2]), r[3] if r[3] is None else int(r[3]), r[4]) for r in rows]
+    return cur.fetchall()
 
 
 # -----------------------------
@@ -1098,42 +1510,25 @@ def upsert_week_plan(
     notes: Optional[str],
 ) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO weekly_plan(patient_id, week_start, planned_km, planned_hours, phase, notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(patient_id, week_start) DO UPDATE SET
-            planned_km=excluded.planned_km,
-            planned_hours=excluded.planned_hours,
-            phase=excluded.phase,
-            notes=excluded.notes,
-            updated_at=datetime('now')
-    """, (int(patient_id), week_start, planned_km, planned_hours, phase, notes))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT INTO weekly_plan(patient_id, week_start, planned_km, planned_hours, phase, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(patient_id, week_start) DO UPDATE SET
+                planned_km=excluded.planned_km,
+                planned_hours=excluded.planned_hours,
+                phase=excluded.phase,
+                notes=excluded.notes,
+                updated_at=datetime('now')
+        """, (int(patient_id), week_start, planned_km, planned_hours, phase, notes))
 
 
 def fetch_week_plans(patient_id: int) -> List[Tuple[str, Optional[float], Optional[float], Optional[str], Optional[str]]]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT week_start, planned_km, planned_hours, phase, notes
-        FROM weekly_plan
-        WHERE patient_id = ?
-        ORDER BY week_start ASC
-    """, (int(patient_id),))
+    cur = conn.execute(_HOT_SQL["fetch_week_plans"], (int(patient_id),))
     rows = cur.fetchall()
-    conn.close()
-    out: List[Tuple[str, Optional[float], Optional[float], Optional[str], Optional[str]]] = []
-    for r in rows:
-        out.append((
-            str(r[0]),
-            None if r[1] is None else float(r[1]),
-            None if r[2] is None else float(r[2]),
-            r[3],
-            r[4],
-        ))
-    return out
+    # REAL affinity on planned_km/planned_hours already yields float|None.
+    return rows
 
 
 # -----------------------------
@@ -1148,57 +1543,83 @@ def save_strava_tokens(
     scope: Optional[str],
 ) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO strava_tokens(patient_id, access_token, refresh_token, expires_at, athlete_id, scope)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(patient_id) DO UPDATE SET
-            access_token=excluded.access_token,
-            refresh_token=excluded.refresh_token,
-            expires_at=excluded.expires_at,
-            athlete_id=excluded.athlete_id,
-            scope=excluded.scope,
-            updated_at=datetime('now')
-    """, (int(patient_id), access_token, refresh_token, int(expires_at), athlete_id, scope))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT INTO strava_tokens(patient_id, access_token, refresh_token, expires_at, athlete_id, scope)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(patient_id) DO UPDATE SET
+                access_token=excluded.access_token,
+                refresh_token=excluded.refresh_token,
+                expires_at=excluded.expires_at,
+                athlete_id=excluded.athlete_id,
+                scope=excluded.scope,
+                updated_at=datetime('now')
+        """, (int(patient_id), access_token, refresh_token, int(expires_at), athlete_id, scope))
 
 
 def get_strava_tokens(patient_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT access_token, refresh_token, expires_at, athlete_id, scope
-        FROM strava_tokens
-        WHERE patient_id = ?
-    """, (int(patient_id),))
+    cur = conn.execute(_HOT_SQL["get_strava_tokens"], (int(patient_id),))
     row = cur.fetchone()
-    conn.close()
     return row  # None or tuple(access, refresh, expires_at, athlete_id, scope)
 
 
 def mark_activity_synced(patient_id: int, activity_id: int) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT OR IGNORE INTO strava_synced(patient_id, strava_activity_id)
-        VALUES (?, ?)
-    """, (int(patient_id), int(activity_id)))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT OR IGNORE INTO strava_synced(patient_id, strava_activity_id)
+            VALUES (?, ?)
+        """, (int(patient_id), int(activity_id)))
 
 
-def is_activity_synced(patient_id: int, activity_id: int) -> bool:
+def fetch_synced_activity_ids(patient_id: int) -> Set[int]:
+    """
+    All synced Strava activity ids for a patient, for O(1) membership
+    checks during a sync instead of one is_activity_synced query per activity.
+    """
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT 1
+    cur = conn.execute("""
+        SELECT strava_activity_id
         FROM strava_synced
-        WHERE patient_id = ? AND strava_activity_id = ?
-        LIMIT 1
-    """, (int(patient_id), int(activity_id)))
+        WHERE patient_id = ?
+    """, (int(patient_id),))
+    ids = {int(r[0]) for r in cur.fetchall()}
+    return ids
+
+
+def filter_unsynced(patient_id: int, activity_ids: List[int]) -> Set[int]:
+    """
+    Returns the subset of activity_ids not yet synced for the patient (one query).
+    """
+    ids = {int(a) for a in activity_ids}
+    if not ids:
+        return set()
+    conn = get_conn()
+    placeholders = ",".join("?" * len(ids))
+    cur = conn.execute(f"""
+        SELECT strava_activity_id
+        FROM strava_synced
+        WHERE patient_id = ? AND strava_activity_id IN ({placeholders})
+    """, [int(patient_id), *ids])
+    return ids - {int(r[0]) for r in cur.fetchall()}
+
+
+def mark_activities_synced(patient_id: int, activity_ids: List[int]) -> None:
+    rows = [(int(patient_id), int(a)) for a in activity_ids]
+    if not rows:
+        return
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO strava_synced(patient_id, strava_activity_id)
+            VALUES (?, ?)
+        """, rows)
+
+
+def is_activity_synced(patient_id: int, activity_id: int) -> bool:
+    conn = get_conn()
+    cur = conn.execute(_HOT_SQL["is_activity_synced"], (int(patient_id), int(activity_id)))
     ok = cur.fetchone() is not None
-    conn.close()
     return ok
 
 
@@ -1214,47 +1635,81 @@ def upsert_exercise(
     notes: Optional[str] = None,
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO exercises(name, category, laterality, implement, primary_muscles, notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(name) DO UPDATE SET
-            category=excluded.category,
-            laterality=excluded.laterality,
-            implement=excluded.implement,
-            primary_muscles=excluded.primary_muscles,
-            notes=excluded.notes
-    """, (name, category, laterality, implement, primary_muscles, notes))
-    conn.commit()
-    cur.execute("SELECT id FROM exercises WHERE name = ?", (name,))
-    ex_id = int(cur.fetchone()[0])
-    conn.close()
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO exercises(name, category, laterality, implement, primary_muscles, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                category=excluded.category,
+                laterality=excluded.laterality,
+                implement=excluded.implement,
+                primary_muscles=excluded.primary_muscles,
+                notes=excluded.notes
+        """ + _RETURNING_ID, (name, category, laterality, implement, primary_muscles, notes))
+        if not _HAS_RETURNING:
+            cur = conn.execute("SELECT id FROM exercises WHERE name = ?", (name,))
+        ex_id = int(cur.fetchone()[0])
     return ex_id
 
 
+def bulk_upsert_exercises(rows: Iterable[Tuple]) -> Dict[str, int]:
+    """
+    rows: (name, category, laterality, implement, primary_muscles, notes)
+    Upserts all rows in one transaction and returns {name: exercise_id}.
+    """
+    rows = list(rows)
+    if not rows:
+        return {}
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT INTO exercises(name, category, laterality, implement, primary_muscles, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                category=excluded.category,
+                laterality=excluded.laterality,
+                implement=excluded.implement,
+                primary_muscles=excluded.primary_muscles,
+                notes=excluded.notes
+        """, rows)
+        names = [r[0] for r in rows]
+        placeholders = ",".join("?" * len(names))
+        cur = conn.execute(f"SELECT name, id FROM exercises WHERE name IN ({placeholders})", names)
+        ids = {str(r[0]): int(r[1]) for r in cur.fetchall()}
+    return ids
+
+
 def get_exercise(exercise_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, name, category, laterality, implement, primary_muscles, notes
-        FROM exercises
-        WHERE id = ?
-    """, (int(exercise_id),))
+    cur = conn.execute(_HOT_SQL["get_exercise"], (int(exercise_id),))
     row = cur.fetchone()
-    conn.close()
     return row
 
 
+def get_exercises_bulk(exercise_ids: Iterable[int]) -> Dict[int, Tuple]:
+    """
+    Same columns as get_exercise, keyed by id, in one query. Missing ids are absent.
+    """
+    ids = sorted({int(x) for x in exercise_ids})
+    if not ids:
+        return {}
+    conn = get_conn()
+    placeholders = ",".join("?" * len(ids))
+    cur = conn.execute(f"""
+        SELECT id, name, category, laterality, implement, primary_muscles, notes
+        FROM exercises
+        WHERE id IN ({placeholders})
+    """, ids)
+    return {int(r[0]): r for r in cur.fetchall()}
+
+
 def list_exercises() -> List[Tuple[int, str, Optional[str], Optional[str], Optional[str]]]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
+    cur = conn.execute("""
         SELECT id, name, category, laterality, implement
         FROM exercises
         ORDER BY name ASC
     """)
     rows = cur.fetchall()
-    conn.close()
     return [(int(r[0]), str(r[1]), r[2], r[3], r[4]) for r in rows]
 
 
@@ -1277,29 +1732,72 @@ def upsert_rep_scheme(
     intent: Optional[str],
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO rep_schemes(
-            goal, phase, reps_min, reps_max, sets_min, sets_max,
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO rep_schemes(
+                goal, phase, reps_min, reps_max, sets_min, sets_max,
+                pct_1rm_min, pct_1rm_max, rpe_min, rpe_max,
+                rest_sec_min, rest_sec_max, intent
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(goal, COALESCE(phase, '')) DO UPDATE SET
+                reps_min=excluded.reps_min,
+                reps_max=excluded.reps_max,
+                sets_min=excluded.sets_min,
+                sets_max=excluded.sets_max,
+                pct_1rm_min=excluded.pct_1rm_min,
+                pct_1rm_max=excluded.pct_1rm_max,
+                rpe_min=excluded.rpe_min,
+                rpe_max=excluded.rpe_max,
+                rest_sec_min=excluded.rest_sec_min,
+                rest_sec_max=excluded.rest_sec_max,
+                intent=excluded.intent
+        """ + _RETURNING_ID, (
+            goal, phase, int(reps_min), int(reps_max), int(sets_min), int(sets_max),
             pct_1rm_min, pct_1rm_max, rpe_min, rpe_max,
             rest_sec_min, rest_sec_max, intent
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        goal, phase, int(reps_min), int(reps_max), int(sets_min), int(sets_max),
-        pct_1rm_min, pct_1rm_max, rpe_min, rpe_max,
-        rest_sec_min, rest_sec_max, intent
-    ))
-    conn.commit()
-    rs_id = int(cur.lastrowid)
-    conn.close()
+        ))
+        if not _HAS_RETURNING:
+            cur = conn.execute(
+                "SELECT id FROM rep_schemes WHERE goal = ? AND COALESCE(phase, '') = COALESCE(?, '')",
+                (goal, phase),
+            )
+        rs_id = int(cur.fetchone()[0])
     return rs_id
 
 
+def bulk_upsert_rep_schemes(rows: Iterable[Tuple]) -> None:
+    """
+    rows: (goal, phase, reps_min, reps_max, sets_min, sets_max,
+           pct_1rm_min, pct_1rm_max, rpe_min, rpe_max,
+           rest_sec_min, rest_sec_max, intent)
+    """
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT INTO rep_schemes(
+                goal, phase, reps_min, reps_max, sets_min, sets_max,
+                pct_1rm_min, pct_1rm_max, rpe_min, rpe_max,
+                rest_sec_min, rest_sec_max, intent
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(goal, COALESCE(phase, '')) DO UPDATE SET
+                reps_min=excluded.reps_min,
+                reps_max=excluded.reps_max,
+                sets_min=excluded.sets_min,
+                sets_max=excluded.sets_max,
+                pct_1rm_min=excluded.pct_1rm_min,
+                pct_1rm_max=excluded.pct_1rm_max,
+                rpe_min=excluded.rpe_min,
+                rpe_max=excluded.rpe_max,
+                rest_sec_min=excluded.rest_sec_min,
+                rest_sec_max=excluded.rest_sec_max,
+                intent=excluded.intent
+        """, rows)
+
+
 def list_rep_schemes(goal: str) -> List[Tuple]:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
+    cur = conn.execute("""
         SELECT id, goal, phase, reps_min, reps_max, sets_min, sets_max,
                pct_1rm_min, pct_1rm_max, rpe_min, rpe_max,
                rest_sec_min, rest_sec_max, intent
@@ -1308,7 +1806,6 @@ def list_rep_schemes(goal: str) -> List[Tuple]:
         ORDER BY id ASC
     """, (goal,))
     rows = cur.fetchall()
-    conn.close()
     return rows
 
 
@@ -1329,29 +1826,60 @@ def upsert_norm_standard(
     notes: Optional[str] = None,
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO norm_strength_standards(
-            exercise_id, sex, age_min, age_max, metric,
-            poor, fair, good, excellent, source, notes
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        int(exercise_id), sex, int(age_min), int(age_max), metric,
-        float(poor), float(fair), float(good), float(excellent), source, notes
-    ))
-    conn.commit()
-    ns_id = int(cur.lastrowid)
-    conn.close()
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO norm_strength_standards(
+                exercise_id, sex, age_min, age_max, metric,
+                poor, fair, good, excellent, source, notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(exercise_id, sex, age_min, age_max, metric) DO UPDATE SET
+                poor=excluded.poor,
+                fair=excluded.fair,
+                good=excluded.good,
+                excellent=excluded.excellent,
+                source=excluded.source,
+                notes=excluded.notes
+        """ + _RETURNING_ID, (
+            int(exercise_id), sex, int(age_min), int(age_max), metric,
+            float(poor), float(fair), float(good), float(excellent), source, notes
+        ))
+        if not _HAS_RETURNING:
+            cur = conn.execute("""
+                SELECT id FROM norm_strength_standards
+                WHERE exercise_id = ? AND sex = ? AND age_min = ? AND age_max = ? AND metric = ?
+            """, (int(exercise_id), sex, int(age_min), int(age_max), metric))
+        ns_id = int(cur.fetchone()[0])
     return ns_id
 
 
+def bulk_upsert_norm_standards(rows: Iterable[Tuple]) -> None:
+    """
+    rows: (exercise_id, sex, age_min, age_max, metric,
+           poor, fair, good, excellent, source, notes)
+    Upserts on the (exercise_id, sex, age_min, age_max, metric) band in one transaction.
+    """
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT INTO norm_strength_standards(
+                exercise_id, sex, age_min, age_max, metric,
+                poor, fair, good, excellent, source, notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(exercise_id, sex, age_min, age_max, metric) DO UPDATE SET
+                poor=excluded.poor,
+                fair=excluded.fair,
+                good=excluded.good,
+                excellent=excluded.excellent,
+                source=excluded.source,
+                notes=excluded.notes
+        """, rows)
+
+
 def count_norm_rows() -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(1) FROM norm_strength_standards")
+    cur = conn.execute("SELECT COUNT(1) FROM norm_strength_standards")
     n = int(cur.fetchone()[0])
-    conn.close()
     return n
 
 
@@ -1362,23 +1890,64 @@ def get_norm_standard(exercise_id: int, sex: str, age: int, metric: str):
     or None if not found
     """
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT poor, fair, good, excellent, source, notes, age_min, age_max
-        FROM norm_strength_standards
-        WHERE exercise_id = ?
-          AND sex = ?
-          AND metric = ?
-          AND age_min <= ?
-          AND age_max >= ?
-        ORDER BY age_min DESC
-        LIMIT 1
-    """, (int(exercise_id), sex, metric, int(age), int(age)))
+    cur = conn.execute(_HOT_SQL["get_norm_standard"], (int(exercise_id), sex, metric, int(age), int(age)))
     row = cur.fetchone()
-    conn.close()
     return row
 
 
+def get_norm_tier(exercise_id: int, sex: str, age: int, metric: str, value: float) -> Optional[str]:
+    """
+    Classifies value against the matching norm band in SQL:
+      'poor' | 'fair' | 'good' | 'excellent', or None if no band exists.
+    """
+    v = float(value)
+    conn = get_conn()
+    cur = conn.execute(
+        _HOT_SQL["get_norm_tier"],
+        (v, v, v, int(exercise_id), sex, metric, int(age), int(age)),
+    )
+    row = cur.fetchone()
+    return None if row is None else row[0]
+
+
+def get_norm_standards_bulk(
+    pairs: List[Tuple[int, str, str, int]],
+) -> Dict[Tuple[int, str, str, int], Tuple]:
+    """
+    Batched get_norm_standard in one query.
+
+    pairs: (exercise_id, sex, metric, age)
+    Returns {pair: (poor, fair, good, excellent, source, notes, age_min, age_max)};
+    pairs without a matching band are omitted.
+    """
+    keys = list(dict.fromkeys((int(e), sex, metric, int(age)) for e, sex, metric, age in pairs))
+    if not keys:
+        return {}
+    values = ", ".join(["(?, ?, ?, ?, ?)"] * len(keys))
+    params: List[Any] = []
+    for idx, key in enumerate(keys):
+        params.extend([idx, *key])
+
+    conn = get_conn()
+    cur = conn.execute(f"""
+        WITH q(idx, exercise_id, sex, metric, age) AS (VALUES {values})
+        SELECT idx, poor, fair, good, excellent, source, notes, age_min, age_max
+        FROM (
+            SELECT q.idx, s.poor, s.fair, s.good, s.excellent, s.source, s.notes, s.age_min, s.age_max,
+                   ROW_NUMBER() OVER (PARTITION BY q.idx ORDER BY s.age_min DESC) AS rn
+            FROM q
+            JOIN norm_strength_standards s
+              ON s.exercise_id = q.exercise_id
+             AND s.sex = q.sex
+             AND s.metric = q.metric
+            WHERE s.age_min <= q.age
+              AND s.age_max >= q.age
+        )
+        WHERE rn = 1
+    """, params)
+    return {keys[r[0]]: tuple(r[1:]) for r in cur.fetchall()}
+
+
 # -----------------------------
 # Patient profile (sex/dob/BW/level)
 # -----------------------------
@@ -1390,31 +1959,23 @@ def upsert_patient_profile(
     presumed_level: Optional[str],
 ) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO patient_profile(patient_id, sex, dob, bodyweight_kg, presumed_level)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(patient_id) DO UPDATE SET
-            sex=excluded.sex,
-            dob=excluded.dob,
-            bodyweight_kg=excluded.bodyweight_kg,
-            presumed_level=excluded.presumed_level,
-            updated_at=datetime('now')
-    """, (int(patient_id), sex, dob, bodyweight_kg, presumed_level))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            INSERT INTO patient_profile(patient_id, sex, dob, bodyweight_kg, presumed_level)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(patient_id) DO UPDATE SET
+                sex=excluded.sex,
+                dob=excluded.dob,
+                bodyweight_kg=excluded.bodyweight_kg,
+                presumed_level=excluded.presumed_level,
+                updated_at=datetime('now')
+        """, (int(patient_id), sex, dob, bodyweight_kg, presumed_level))
 
 
 def get_patient_profile(patient_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT sex, dob, bodyweight_kg, presumed_level
-        FROM patient_profile
-        WHERE patient_id = ?
-    """, (int(patient_id),))
+    cur = conn.execute(_HOT_SQL["get_patient_profile"], (int(patient_id),))
     row = cur.fetchone()
-    conn.close()
     return row  # None or (sex, dob, bodyweight_kg, presumed_level)
 
 
@@ -1435,47 +1996,38 @@ def upsert_strength_estimate(
     notes: Optional[str] = None,
 ) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO strength_estimates(
-            patient_id, exercise_id, as_of_date,
+    with conn:
+        conn.execute("""
+            INSERT INTO strength_estimates(
+                patient_id, exercise_id, as_of_date,
+                estimated_1rm_kg, estimated_rel_1rm_bw,
+                level_used, sex_used, age_used, bw_used,
+                method, notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(patient_id, exercise_id) DO UPDATE SET
+                as_of_date=excluded.as_of_date,
+                estimated_1rm_kg=excluded.estimated_1rm_kg,
+                estimated_rel_1rm_bw=excluded.estimated_rel_1rm_bw,
+                level_used=excluded.level_used,
+                sex_used=excluded.sex_used,
+                age_used=excluded.age_used,
+                bw_used=excluded.bw_used,
+                method=excluded.method,
+                notes=excluded.notes,
+                updated_at=datetime('now')
+        """, (
+            int(patient_id), int(exercise_id), as_of_date,
             estimated_1rm_kg, estimated_rel_1rm_bw,
-            level_used, sex_used, age_used, bw_used,
+            level_used, sex_used, int(age_used), bw_used,
             method, notes
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(patient_id, exercise_id) DO UPDATE SET
-            as_of_date=excluded.as_of_date,
-            estimated_1rm_kg=excluded.estimated_1rm_kg,
-            estimated_rel_1rm_bw=excluded.estimated_rel_1rm_bw,
-            level_used=excluded.level_used,
-            sex_used=excluded.sex_used,
-            age_used=excluded.age_used,
-            bw_used=excluded.bw_used,
-            method=excluded.method,
-            notes=excluded.notes,
-            updated_at=datetime('now')
-    """, (
-        int(patient_id), int(exercise_id), as_of_date,
-        estimated_1rm_kg, estimated_rel_1rm_bw,
-        level_used, sex_used, int(age_used), bw_used,
-        method, notes
-    ))
-    conn.commit()
-    conn.close()
+        ))
 
 
 def get_strength_estimate(patient_id: int, exercise_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT as_of_date, estimated_1rm_kg, estimated_rel_1rm_bw,
-               level_used, sex_used, age_used, bw_used, method, notes
-        FROM strength_estimates
-        WHERE patient_id = ? AND exercise_id = ?
-    """, (int(patient_id), int(exercise_id)))
+    cur = conn.execute(_HOT_SQL["get_strength_estimate"], (int(patient_id), int(exercise_id)))
     row = cur.fetchone()
-    conn.close()
     return row
 
 
@@ -1548,6 +2100,115 @@ def estimate_e1rm_kg_for_exercise(
     }
 
 
+# (fair, good, excellent) weights per level; mirrors _level_to_target_ratio.
+_LEVEL_WEIGHTS: Dict[str, Tuple[float, float, float]] = {
+    "novice": (1.0, 0.0, 0.0),
+    "intermediate": (0.5, 0.5, 0.0),
+    "advanced": (0.0, 1.0, 0.0),
+    "expert": (0.0, 0.5, 0.5),
+}
+
+
+def estimate_e1rm_bulk(
+    patient_sex: str,
+    patient_age: int,
+    patient_bw_kg: Optional[float],
+    presumed_level: str,
+    exercise_metrics: List[Tuple[int, str]],
+) -> Dict[Tuple[int, str], Dict[str, Any]]:
+    """
+    Bulk form of estimate_e1rm_kg_for_exercise: one get_norm_standards_bulk
+    query for all (exercise_id, metric) pairs, target ratios computed as array ops.
+
+    Returns {(exercise_id, metric): same dict as estimate_e1rm_kg_for_exercise}.
+    """
+    out: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    pending: List[Tuple[int, str]] = []
+    for exercise_id, metric in exercise_metrics:
+        key = (int(exercise_id), metric)
+        if metric == "pullup_reps":
+            out[key] = {
+                "estimated_1rm_kg": None,
+                "estimated_rel_1rm_bw": None,
+                "method": "not_applicable_pullup",
+                "notes": "Pull-ups prescribed via reps/sets; no 1RM estimate.",
+                "band_used": None,
+            }
+        elif not patient_bw_kg or patient_bw_kg <= 0:
+            out[key] = {
+                "estimated_1rm_kg": None,
+                "estimated_rel_1rm_bw": None,
+                "method": "missing_bodyweight",
+                "notes": "Bodyweight is required to estimate 1RM from relative norms.",
+                "band_used": None,
+            }
+        elif key not in out:
+            out[key] = {}
+            pending.append(key)
+
+    bulk = get_norm_standards_bulk(
+        [(exercise_id, patient_sex, metric, int(patient_age)) for exercise_id, metric in pending]
+    )
+    norms: Dict[Tuple[int, str], Tuple] = {
+        (exercise_id, metric): row[1:] for (exercise_id, _, metric, _), row in bulk.items()
+    }
+
+    found = [key for key in pending if key in norms]
+    for key in pending:
+        if key not in norms:
+            out[key] = {
+                "estimated_1rm_kg": None,
+                "estimated_rel_1rm_bw": None,
+                "method": "no_norm_found",
+                "notes": "No normative standard found for this exercise/sex/age/metric.",
+                "band_used": None,
+            }
+
+    if found:
+        bands = np.array([norms[key][:3] for key in found], dtype=np.float64)
+        weights = np.array(
+            _LEVEL_WEIGHTS.get((presumed_level or "intermediate").lower(), _LEVEL_WEIGHTS["intermediate"]),
+            dtype=np.float64,
+        )
+        target_rel = bands @ weights
+        e1rm = target_rel * float(patient_bw_kg)
+        for key, rel, kg in zip(found, target_rel.tolist(), e1rm.tolist()):
+            _, _, _, source, notes, age_min, age_max = norms[key]
+            out[key] = {
+                "estimated_1rm_kg": kg,
+                "estimated_rel_1rm_bw": rel,
+                "method": "norm_level_band_v1",
+                "notes": f"Norms: {source or ''} {notes or ''}".strip(),
+                "band_used": f"{age_min}-{age_max}",
+            }
+
+    return out
+
+
+# Per-leg ratio of bilateral e1RM, keyed by (movement, level).
+_UNI_BASE: Dict[Tuple[str, str], float] = {
+    ("bss", "novice"): 0.35,
+    ("bss", "intermediate"): 0.40,
+    ("bss", "advanced"): 0.45,
+    ("bss", "expert"): 0.50,
+    ("stepup", "novice"): 0.35,
+    ("stepup", "intermediate"): 0.40,
+    ("stepup", "advanced"): 0.45,
+    ("stepup", "expert"): 0.50,
+    ("sl_rdl", "novice"): 0.30,
+    ("sl_rdl", "intermediate"): 0.35,
+    ("sl_rdl", "advanced"): 0.40,
+    ("sl_rdl", "expert"): 0.45,
+}
+
+# Fallback ratio per movement when the level is unrecognised.
+_UNI_DEFAULT: Dict[str, float] = {
+    "bss": 0.40,
+    "stepup": 0.40,
+    "sl_rdl": 0.35,
+}
+
+
 def estimate_unilateral_from_bilateral(
     bilateral_e1rm_kg: Optional[float],
     movement: str,
@@ -1565,31 +2226,47 @@ def estimate_unilateral_from_bilateral(
     lvl = (presumed_level or "intermediate").lower()
     mv = (movement or "").lower().strip()
 
-    if mv in ["bss", "stepup"]:
-        base = 0.40
-        if lvl == "novice":
-            base = 0.35
-        elif lvl == "advanced":
-            base = 0.45
-        elif lvl == "expert":
-            base = 0.50
-    elif mv in ["sl_rdl"]:
-        base = 0.35
-        if lvl == "novice":
-            base = 0.30
-        elif lvl == "advanced":
-            base = 0.40
-        elif lvl == "expert":
-            base = 0.45
-    else:
-        base = 0.35
-
+    base = _UNI_BASE.get((mv, lvl), _UNI_DEFAULT.get(mv, 0.35))
     return float(bilateral_e1rm_kg) * float(base)
 
 
 # =========================================================
 # S&C Programming helpers (blocks/weeks/sessions/exercises)
 # =========================================================
+@dataclass(slots=True, frozen=True)
+class ExerciseRow:
+    row_id: int
+    exercise_name: str
+    sets_target: int
+    reps_target: int
+    pct_1rm_target: Optional[float]
+    load_kg_target: Optional[float]
+    rpe_target: Optional[int]
+    rest_sec_target: Optional[int]
+    intent: Optional[str]
+    notes: Optional[str]
+    sets_actual: Optional[int]
+    reps_actual: Optional[int]
+    load_kg_actual: Optional[float]
+    completed_flag: int
+    actual_notes: Optional[str]
+
+
+@dataclass(slots=True, frozen=True)
+class SessionBlock:
+    week_no: int
+    week_start: str
+    focus: Optional[str]
+    deload_flag: bool
+    session_label: str
+    day_hint: Optional[str]
+    exercises: Tuple[ExerciseRow, ...]
+
+
+def _exercise_row_factory(cur: sqlite3.Cursor, row: Tuple) -> ExerciseRow:
+    return ExerciseRow(*row)
+
+
 def create_sc_block(
     patient_id: int,
     start_date: str,
@@ -1601,29 +2278,19 @@ def create_sc_block(
     sessions_per_week: int = 2,
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO sc_blocks(patient_id, start_date, weeks, model, deload_week, sessions_per_week, goal, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (int(patient_id), start_date, int(weeks), model, int(deload_week), int(sessions_per_week), goal, notes))
-    conn.commit()
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO sc_blocks(patient_id, start_date, weeks, model, deload_week, sessions_per_week, goal, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (int(patient_id), start_date, int(weeks), model, int(deload_week), int(sessions_per_week), goal, notes))
     block_id = int(cur.lastrowid)
-    conn.close()
     return block_id
 
 
 def fetch_latest_sc_block(patient_id: int):
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT id, start_date, weeks, model, deload_week, sessions_per_week, goal, notes, created_at
-        FROM sc_blocks
-        WHERE patient_id = ?
-        ORDER BY id DESC
-        LIMIT 1
-    """, (int(patient_id),))
+    cur = conn.execute(_HOT_SQL["fetch_latest_sc_block"], (int(patient_id),))
     row = cur.fetchone()
-    conn.close()
     return row
 
 
@@ -1636,20 +2303,22 @@ def upsert_sc_week(
     notes: Optional[str] = None,
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO sc_weeks(block_id, week_no, week_start, focus, deload_flag, notes)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(block_id, week_no) DO UPDATE SET
-            week_start=excluded.week_start,
-            focus=excluded.focus,
-            deload_flag=excluded.deload_flag,
-            notes=excluded.notes
-    """, (int(block_id), int(week_no), week_start, focus, 1 if deload_flag else 0, notes))
-    conn.commit()
-    cur.execute("SELECT id FROM sc_weeks WHERE block_id=? AND week_no=?", (int(block_id), int(week_no)))
-    week_id = int(cur.fetchone()[0])
-    conn.close()
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO sc_weeks(block_id, week_no, week_start, focus, deload_flag, notes)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(block_id, week_no) DO UPDATE SET
+                week_start=excluded.week_start,
+                focus=excluded.focus,
+                deload_flag=excluded.deload_flag,
+                notes=excluded.notes
+        """ + _RETURNING_ID, (int(block_id), int(week_no), week_start, focus, 1 if deload_flag else 0, notes))
+        if not _HAS_RETURNING:
+            cur = conn.execute(
+                "SELECT id FROM sc_weeks WHERE block_id = ? AND week_no = ?",
+                (int(block_id), int(week_no)),
+            )
+        week_id = int(cur.fetchone()[0])
     return week_id
 
 
@@ -1660,27 +2329,89 @@ def upsert_sc_session(
     notes: Optional[str] = None,
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO sc_sessions(week_id, session_label, day_hint, notes)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(week_id, session_label) DO UPDATE SET
-            day_hint=excluded.day_hint,
-            notes=excluded.notes
-    """, (int(week_id), session_label, day_hint, notes))
-    conn.commit()
-    cur.execute("SELECT id FROM sc_sessions WHERE week_id=? AND session_label=?", (int(week_id), session_label))
-    sid = int(cur.fetchone()[0])
-    conn.close()
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO sc_sessions(week_id, session_label, day_hint, notes)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(week_id, session_label) DO UPDATE SET
+                day_hint=excluded.day_hint,
+                notes=excluded.notes
+        """ + _RETURNING_ID, (int(week_id), session_label, day_hint, notes))
+        if not _HAS_RETURNING:
+            cur = conn.execute(
+                "SELECT id FROM sc_sessions WHERE week_id = ? AND session_label = ?",
+                (int(week_id), session_label),
+            )
+        sid = int(cur.fetchone()[0])
     return sid
 
 
+def create_sc_block_weeks_and_sessions(
+    block_id: int,
+    weeks: List[Tuple[int, str, Optional[str], bool, List[str]]],
+) -> Dict[Tuple[int, str], int]:
+    """
+    weeks: (week_no, week_start, focus, deload_flag, session_labels)
+    Upserts every week and session of a block in one transaction (driven by
+    json_each) and clears their exercises. Returns {(week_no, label): session_id}.
+    """
+    payload = json.dumps([
+        {"wk": int(wk), "start": start, "focus": focus, "deload": 1 if deload else 0, "labels": list(labels)}
+        for wk, start, focus, deload, labels in weeks
+    ])
+    bid = int(block_id)
+    with _bulk_write() as conn:
+        conn.execute("""
+            INSERT INTO sc_weeks(block_id, week_no, week_start, focus, deload_flag, notes)
+            SELECT ?,
+                   json_extract(j.value, '$.wk'),
+                   json_extract(j.value, '$.start'),
+                   json_extract(j.value, '$.focus'),
+                   json_extract(j.value, '$.deload'),
+                   NULL
+            FROM json_each(?) j
+            WHERE true
+            ON CONFLICT(block_id, week_no) DO UPDATE SET
+                week_start=excluded.week_start,
+                focus=excluded.focus,
+                deload_flag=excluded.deload_flag,
+                notes=excluded.notes
+        """, (bid, payload))
+        conn.execute("""
+            INSERT INTO sc_sessions(week_id, session_label, day_hint, notes)
+            SELECT w.id, l.value, NULL, NULL
+            FROM json_each(?) j
+            JOIN sc_weeks w
+              ON w.block_id = ? AND w.week_no = json_extract(j.value, '$.wk')
+            JOIN json_each(j.value, '$.labels') l
+            WHERE true
+            ON CONFLICT(week_id, session_label) DO UPDATE SET
+                day_hint=excluded.day_hint,
+                notes=excluded.notes
+        """, (payload, bid))
+        conn.execute("""
+            DELETE FROM sc_session_exercises
+            WHERE session_id IN (
+                SELECT s.id
+                FROM sc_sessions s
+                JOIN sc_weeks w ON w.id = s.week_id
+                WHERE w.block_id = ?
+            )
+        """, (bid,))
+        cur = conn.execute("""
+            SELECT w.week_no, s.session_label, s.id
+            FROM sc_sessions s
+            JOIN sc_weeks w ON w.id = s.week_id
+            WHERE w.block_id = ?
+        """, (bid,))
+        ids = {(int(r[0]), str(r[1])): int(r[2]) for r in cur.fetchall()}
+    return ids
+
+
 def clear_sc_session_exercises(session_id: int) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM sc_session_exercises WHERE session_id = ?", (int(session_id),))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("DELETE FROM sc_session_exercises WHERE session_id = ?", (int(session_id),))
 
 
 def add_sc_session_exercise(
@@ -1696,25 +2427,39 @@ def add_sc_session_exercise(
     notes: Optional[str],
 ) -> int:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO sc_session_exercises(
-            session_id, exercise_id,
-            sets_target, reps_target, pct_1rm_target, load_kg_target,
+    with conn:
+        cur = conn.execute("""
+            INSERT INTO sc_session_exercises(
+                session_id, exercise_id,
+                sets_target, reps_target, pct_1rm_target, load_kg_target,
+                rpe_target, rest_sec_target, intent, notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            int(session_id), int(exercise_id),
+            int(sets_target), int(reps_target), pct_1rm_target, load_kg_target,
             rpe_target, rest_sec_target, intent, notes
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        int(session_id), int(exercise_id),
-        int(sets_target), int(reps_target), pct_1rm_target, load_kg_target,
-        rpe_target, rest_sec_target, intent, notes
-    ))
-    conn.commit()
+        ))
     rid = int(cur.lastrowid)
-    conn.close()
     return rid
 
 
+def bulk_add_sc_session_exercises(rows: Iterable[Tuple]) -> None:
+    """
+    rows: (session_id, exercise_id, sets_target, reps_target, pct_1rm_target,
+           load_kg_target, rpe_target, rest_sec_target, intent, notes)
+    """
+    with _bulk_write() as conn:
+        conn.executemany("""
+            INSERT INTO sc_session_exercises(
+                session_id, exercise_id,
+                sets_target, reps_target, pct_1rm_target, load_kg_target,
+                rpe_target, rest_sec_target, intent, notes
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+
+
 def update_sc_session_exercise_actual(
     row_id: int,
     sets_actual: Optional[int],
@@ -1724,40 +2469,36 @@ def update_sc_session_exercise_actual(
     actual_notes: Optional[str],
 ) -> None:
     conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE sc_session_exercises
-        SET sets_actual=?,
-            reps_actual=?,
-            load_kg_actual=?,
-            completed_flag=?,
-            actual_notes=?
-        WHERE id = ?
-    """, (
-        sets_actual,
-        reps_actual,
-        load_kg_actual,
-        1 if completed_flag else 0,
-        actual_notes,
-        int(row_id),
-    ))
-    conn.commit()
-    conn.close()
+    with conn:
+        conn.execute("""
+            UPDATE sc_session_exercises
+            SET sets_actual=?,
+                reps_actual=?,
+                load_kg_actual=?,
+                completed_flag=?,
+                actual_notes=?
+            WHERE id = ?
+        """, (
+            sets_actual,
+            reps_actual,
+            load_kg_actual,
+            1 if completed_flag else 0,
+            actual_notes,
+            int(row_id),
+        ))
 
 
-def fetch_sc_block_detail(block_id: int):
+def iter_sc_block_detail(block_id: int) -> Iterator[SessionBlock]:
     """
-    Returns list of tuples:
-      (week_no, week_start, focus, deload_flag, session_label, day_hint, exercises_list)
-
-    exercises_list rows:
-      (row_id, exercise_name, sets_t, reps_t, pct_t, load_t, rpe_t, rest_t, intent, notes,
-       sets_a, reps_a, load_a, completed, actual_notes)
+    Yields one SessionBlock per (week, session), ordered by week_no then
+    session_label, each carrying its ExerciseRow entries in insertion order.
     """
     conn = get_conn()
-    cur = conn.cursor()
+    sessions_cur = conn.cursor()
+    ex_cur = conn.cursor()
+    ex_cur.row_factory = _exercise_row_factory
 
-    cur.execute("""
+    sessions_cur.execute("""
         SELECT w.id, w.week_no, w.week_start, w.focus, w.deload_flag,
                s.id, s.session_label, s.day_hint
         FROM sc_weeks w
@@ -1765,23 +2506,164 @@ def fetch_sc_block_detail(block_id: int):
         WHERE w.block_id = ?
         ORDER BY w.week_no ASC, s.session_label ASC
     """, (int(block_id),))
-    rows = cur.fetchall()
 
-    out = []
-    for r in rows:
-        week_id, week_no, week_start, focus, deload_flag, session_id, label, day_hint = r
-        cur.execute("""
-            SELECT x.id, e.name,
-                   x.sets_target, x.reps_target, x.pct_1rm_target, x.load_kg_target,
-                   x.rpe_target, x.rest_sec_target, x.intent, x.notes,
-                   x.sets_actual, x.reps_actual, x.load_kg_actual, x.completed_flag, x.actual_notes
-            FROM sc_session_exercises x
-            JOIN exercises e ON e.id = x.exercise_id
-            WHERE x.session_id = ?
-            ORDER BY x.id ASC
-        """, (int(session_id),))
-        exs = cur.fetchall()
-        out.append((int(week_no), str(week_start), focus, bool(deload_flag), str(label), day_hint, exs))
-
-    conn.close()
-    return out
+    while True:
+        chunk = sessions_cur.fetchmany(_FETCH_CHUNK_SIZE)
+        if not chunk:
+            break
+        for r in chunk:
+            week_id, week_no, week_start, focus, deload_flag, session_id, label, day_hint = r
+            ex_cur.execute("""
+                SELECT x.id, e.name,
+                       x.sets_target, x.reps_target, x.pct_1rm_target, x.load_kg_target,
+                       x.rpe_target, x.rest_sec_target, x.intent, x.notes,
+                       x.sets_actual, x.reps_actual, x.load_kg_actual, x.completed_flag, x.actual_notes
+                FROM sc_session_exercises x
+                JOIN exercises e ON e.id = x.exercise_id
+                WHERE x.session_id = ?
+                ORDER BY x.id ASC
+            """, (int(session_id),))
+            exs = tuple(ex_cur.fetchall())
+            yield SessionBlock(int(week_no), str(week_start), focus, bool(deload_flag), str(label), day_hint, exs)
+
+
+def fetch_sc_block_detail(block_id: int) -> List[SessionBlock]:
+    return list(iter_sc_block_detail(block_id))
+
+
+# =========================================================
+# Async read paths (pooled, for async web handlers)
+# =========================================================
+_ASYNC_POOL = None
+
+
+async def _async_connection_factory():
+    import aiosqlite
+
+    conn = await aiosqlite.connect(DB_PATH)
+    await conn.execute("PRAGMA journal_mode=WAL;")
+    await conn.execute("PRAGMA query_only=ON;")
+    return conn
+
+
+def _get_async_pool():
+    """
+    One read-only aiosqlitepool pool per process, created on first use.
+    aiosqlite/aiosqlitepool are only imported here so sync callers don't need them.
+    """
+    global _ASYNC_POOL
+    if _ASYNC_POOL is None:
+        from aiosqlitepool import SQLiteConnectionPool
+
+        os.makedirs(DB_DIR, exist_ok=True)
+        _ASYNC_POOL = SQLiteConnectionPool(_async_connection_factory)
+    return _ASYNC_POOL
+
+
+async def close_async_pool() -> None:
+    global _ASYNC_POOL
+    if _ASYNC_POOL is not None:
+        await _ASYNC_POOL.close()
+        _ASYNC_POOL = None
+
+
+async def fetch_rides_async(patient_id: int) -> List[Tuple[str, float, int, Optional[int], Optional[str]]]:
+    async with _get_async_pool().connection() as conn:
+        cur = await conn.execute(_HOT_SQL["fetch_rides"], (int(patient_id),))
+        return list(await cur.fetchall())
+
+
+async def fetch_week_plans_async(
+    patient_id: int,
+) -> List[Tuple[str, Optional[float], Optional[float], Optional[str], Optional[str]]]:
+    async with _get_async_pool().connection() as conn:
+        cur = await conn.execute(_HOT_SQL["fetch_week_plans"], (int(patient_id),))
+        return list(await cur.fetchall())
+
+
+async def list_exercises_async() -> List[Tuple[int, str, Optional[str], Optional[str], Optional[str]]]:
+    async with _get_async_pool().connection() as conn:
+        cur = await conn.execute("""
+            SELECT id, name, category, laterality, implement
+            FROM exercises
+            ORDER BY name ASC
+        """)
+        rows = await cur.fetchall()
+        return [(int(r[0]), str(r[1]), r[2], r[3], r[4]) for r in rows]
+
+
+async def _async_user_can_access_patient(conn, user_id: str, role: str, patient_id: int) -> bool:
+    if role not in _ACCESS_ROLES:
+        return False
+    cur = await conn.execute(_PATIENT_ACCESS_SQL, (int(patient_id), user_id, role, user_id))
+    return await cur.fetchone() is not None
+
+
+async def _assert_patient_access_async(user_id: str, role: str, patient_id: int) -> None:
+    async with _get_async_pool().connection() as conn:
+        ok = await _async_user_can_access_patient(conn, user_id, role, patient_id)
+    if not ok:
+        raise PermissionError("User is not permitted to access this patient.")
+
+
+async def _assert_block_access_async(user_id: str, role: str, block_id: int) -> None:
+    async with _get_async_pool().connection() as conn:
+        cur = await conn.execute("SELECT patient_id FROM sc_blocks WHERE id = ?", (int(block_id),))
+        row = await cur.fetchone()
+        if row is None:
+            raise ValueError("Block not found.")
+        ok = await _async_user_can_access_patient(conn, user_id, role, int(row[0]))
+    if not ok:
+        raise PermissionError("User is not permitted to access this block.")
+
+
+async def fetch_rides_for_user_async(
+    user_id: str, role: str, patient_id: int,
+) -> List[Tuple[str, float, int, Optional[int], Optional[str]]]:
+    await _assert_patient_access_async(user_id, role, patient_id)
+    return await fetch_rides_async(patient_id)
+
+
+async def fetch_week_plans_for_user_async(
+    user_id: str, role: str, patient_id: int,
+) -> List[Tuple[str, Optional[float], Optional[float], Optional[str], Optional[str]]]:
+    await _assert_patient_access_async(user_id, role, patient_id)
+    return await fetch_week_plans_async(patient_id)
+
+
+async def fetch_sc_block_detail_for_user_async(user_id: str, role: str, block_id: int) -> List[SessionBlock]:
+    await _assert_block_access_async(user_id, role, block_id)
+    return await fetch_sc_block_detail_async(block_id)
+
+
+async def fetch_sc_block_detail_async(block_id: int) -> List[SessionBlock]:
+    """
+    Async counterpart of fetch_sc_block_detail (same return shape).
+    """
+    async with _get_async_pool().connection() as conn:
+        cur = await conn.execute("""
+            SELECT w.id, w.week_no, w.week_start, w.focus, w.deload_flag,
+                   s.id, s.session_label, s.day_hint
+            FROM sc_weeks w
+            JOIN sc_sessions s ON s.week_id = w.id
+            WHERE w.block_id = ?
+            ORDER BY w.week_no ASC, s.session_label ASC
+        """, (int(block_id),))
+        rows = await cur.fetchall()
+
+        out = []
+        for r in rows:
+            week_id, week_no, week_start, focus, deload_flag, session_id, label, day_hint = r
+            cur = await conn.execute("""
+                SELECT x.id, e.name,
+                       x.sets_target, x.reps_target, x.pct_1rm_target, x.load_kg_target,
+                       x.rpe_target, x.rest_sec_target, x.intent, x.notes,
+                       x.sets_actual, x.reps_actual, x.load_kg_actual, x.completed_flag, x.actual_notes
+                FROM sc_session_exercises x
+                JOIN exercises e ON e.id = x.exercise_id
+                WHERE x.session_id = ?
+                ORDER BY x.id ASC
+            """, (int(session_id),))
+            exs = tuple(ExerciseRow(*x) for x in await cur.fetchall())
+            out.append(SessionBlock(int(week_no), str(week_start), focus, bool(deload_flag), str(label), day_hint, exs))
+        return out
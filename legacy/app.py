@@ -504,8 +504,7 @@ with tab1:
 
     st.divider()
     st.subheader("Recent rides")
-    rides = services.list_rides(user_id, role, pid)
-    rides_df = pd.DataFrame(rides, columns=["ride_date", "distance_km", "duration_min", "rpe", "notes"])
+    rides_df = services.list_rides_df(user_id, role, pid)
     st.dataframe(rides_df, use_container_width=True)
 
 
@@ -559,8 +558,7 @@ with tab2:
     st.divider()
 
     if st.session_state["view_mode"] == "coach":
-        rides = services.list_rides(user_id, role, pid)
-        rides_df = pd.DataFrame(rides, columns=["ride_date", "distance_km", "duration_min", "rpe", "notes"])
+        rides_df = services.list_rides_df(user_id, role, pid)
 
         plan_rows = services.list_week_plans(user_id, role, pid)
         plan_df = pd.DataFrame(plan_rows, columns=["week_start", "planned_km", "planned_hours", "phase", "notes"])
@@ -649,8 +647,7 @@ with tab2:
         st.divider()
         _render_strava_section()
     else:
-        rides = services.list_rides(user_id, role, pid)
-        rides_df = pd.DataFrame(rides, columns=["ride_date", "distance_km", "duration_min", "rpe", "notes"])
+        rides_df = services.list_rides_df(user_id, role, pid)
 
         plan_rows = services.list_week_plans(user_id, role, pid)
         plan_df = pd.DataFrame(plan_rows, columns=["week_start", "planned_km", "planned_hours", "phase", "notes"])
@@ -668,8 +665,6 @@ with tab2:
             if rides_df.empty:
                 st.info("No rides logged yet.")
             else:
-                rides_df = rides_df.copy()
-                rides_df["ride_date"] = pd.to_datetime(rides_df["ride_date"], errors="coerce")
                 today = date.today()
                 week_start = to_monday(today)
                 month_start = today.replace(day=1)
@@ -3,7 +3,9 @@ from __future__ import annotations
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from api import app as api_app
 
@@ -14,17 +16,26 @@ app = FastAPI(title="Ride Log")
 app.mount("/api", api_app)
 
 
-@app.get("/{full_path:path}")
-def serve_react_app(full_path: str) -> FileResponse:
-    if not FRONTEND_DIST.exists():
-        raise HTTPException(status_code=404, detail="Frontend build not found")
+class SPAStaticFiles(StaticFiles):
+    """Serves the built frontend, falling back to index.html for client-side routes."""
 
-    requested = (FRONTEND_DIST / full_path).resolve()
-    if requested.is_file() and FRONTEND_DIST in requested.parents:
-        return FileResponse(requested)
+    async def check_config(self) -> None:
+        try:
+            await super().check_config()
+        except RuntimeError:
+            raise HTTPException(status_code=404, detail="Frontend build not found")
 
-    index_file = FRONTEND_DIST / "index.html"
-    if index_file.exists():
-        return FileResponse(index_file)
+    async def get_response(self, path: str, scope) -> Response:
+        try:
+            return await super().get_response(path, scope)
+        except StarletteHTTPException as exc:
+            if exc.status_code != 404:
+                raise
+        # Read from disk each time so an in-place rebuild never serves stale asset hashes.
+        index = FRONTEND_DIST / "index.html"
+        if not index.is_file():
+            raise HTTPException(status_code=404, detail="Frontend entrypoint not found")
+        return FileResponse(index, media_type="text/html")
 
-    raise HTTPException(status_code=404, detail="Frontend entrypoint not found")
+
+app.mount("/", SPAStaticFiles(directory=FRONTEND_DIST, html=True, check_dir=False), name="frontend")
@@ -1,33 +1,62 @@
 import pandas as pd
 from datetime import date, timedelta
 
+_PLAN_DTYPES = {
+    "planned_km": "float64",
+    "planned_hours": "float64",
+    "phase": "string",
+    "notes": "string",
+}
+
 def to_monday(d: date) -> date:
     return d - timedelta(days=d.weekday())
 
+class _PlanCSVError(ValueError):
+    pass
+
+def _read_plan_csv(file, **kwargs) -> pd.DataFrame:
+    try:
+        return pd.read_csv(file, engine="c", **kwargs)
+    except pd.errors.EmptyDataError as exc:
+        raise _PlanCSVError("Plan CSV is empty.") from exc
+    except UnicodeDecodeError as exc:
+        raise _PlanCSVError("Plan CSV must be UTF-8 encoded.") from exc
+    except pd.errors.ParserError as exc:
+        raise _PlanCSVError(f"Plan CSV could not be parsed: {exc}") from exc
+
 def parse_plan_csv(file) -> pd.DataFrame:
     """
     Expected columns:
       week_start (YYYY-MM-DD, Monday), planned_km, planned_hours, phase, notes
     """
-    df = pd.read_csv(file)
-    if "week_start" not in df.columns:
+    # Header first, so a missing week_start is reported as such rather than as a parse error.
+    columns = _read_plan_csv(file, nrows=0).columns
+    if "week_start" not in columns:
         raise ValueError("Plan CSV must include at least: week_start (YYYY-MM-DD, Monday).")
+    if hasattr(file, "seek"):
+        file.seek(0)
+    try:
+        df = _read_plan_csv(
+            file,
+            dtype={c: t for c, t in _PLAN_DTYPES.items() if c in columns},
+            parse_dates=["week_start"],
+            date_format="%Y-%m-%d",
+        )
+    except _PlanCSVError:
+        raise
+    except ValueError as exc:
+        # Empty, encoding and tokenising errors are mapped in _read_plan_csv; what's left is a dtype cast.
+        raise ValueError("Plan CSV planned_km and planned_hours must be numeric.") from exc
 
-    week_start = pd.to_datetime(df["week_start"], errors="coerce")
-    if week_start.isna().any():
+    week_start = df["week_start"]
+    if not pd.api.types.is_datetime64_any_dtype(week_start) or week_start.isna().any():
         raise ValueError("Plan CSV has invalid week_start dates; expected YYYY-MM-DD.")
-    if not week_start.apply(lambda d: d.weekday() == 0).all():
+    # Epoch day 0 (1970-01-01) was a Thursday, so Mondays satisfy (days + 3) % 7 == 0.
+    days = week_start.to_numpy().astype("datetime64[D]").view("int64")
+    if ((days + 3) % 7).any():
         raise ValueError("Plan CSV week_start dates must be Mondays.")
     df["week_start"] = week_start.dt.date
 
-    for col in ["planned_km", "planned_hours"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-
-    for col in ["phase", "notes"]:
-        if col in df.columns:
-            df[col] = df[col].astype("string")
-
     return df
 
 def rides_to_weekly_summary(rides_df: pd.DataFrame) -> pd.DataFrame:
@@ -38,11 +67,14 @@ def rides_to_weekly_summary(rides_df: pd.DataFrame) -> pd.DataFrame:
     if rides_df.empty:
         return pd.DataFrame(columns=["week_start", "actual_km", "actual_hours", "rides_count"])
 
-    d = rides_df.copy()
-    d["ride_date"] = pd.to_datetime(d["ride_date"]).dt.date
-    d["week_start"] = d["ride_date"].apply(to_monday)
-    d["actual_km"] = d["distance_km"]
-    d["actual_hours"] = d["duration_min"] / 60.0
+    ts = rides_df["ride_date"]
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts)
+    d = rides_df.assign(
+        week_start=(ts - pd.to_timedelta(ts.dt.weekday, unit="D")).dt.normalize(),
+        actual_km=rides_df["distance_km"],
+        actual_hours=rides_df["duration_min"] * (1 / 60),
+    )
 
     out = (
         d.groupby("week_start", as_index=False)
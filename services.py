@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import threading
+import time
 from dataclasses import dataclass
 from datetime import date, timedelta
 from typing import Any, Optional
 
+import numpy as np
 import pandas as pd
+import requests
 
 import db_store as db
-from plan import rides_to_weekly_summary
-from strava import build_auth_url, exchange_code_for_token, ensure_fresh_token, list_activities
+from strava import build_auth_url, exchange_code_for_token, ensure_fresh_token, list_activities_all
 
 
 @dataclass
@@ -20,18 +23,17 @@ class StravaStatus:
     expires_at: Optional[int]
 
 
+_RIDE_KEYS = ("ride_date", "distance_km", "duration_min", "rpe", "notes")
+_PLAN_KEYS = ("week_start", "planned_km", "planned_hours", "phase", "notes")
+
+
 def list_rides(user_id: str, role: str, patient_id: int) -> list[dict[str, Any]]:
     rides = db.fetch_rides_for_user(user_id, role, patient_id)
-    return [
-        {
-            "ride_date": row[0],
-            "distance_km": row[1],
-            "duration_min": row[2],
-            "rpe": row[3],
-            "notes": row[4],
-        }
-        for row in rides
-    ]
+    return [dict(zip(_RIDE_KEYS, row)) for row in rides]
+
+
+def list_rides_df(user_id: str, role: str, patient_id: int) -> pd.DataFrame:
+    return db.fetch_rides_df_for_user(user_id, role, patient_id)
 
 
 def add_ride(
@@ -49,16 +51,7 @@ def add_ride(
 
 def list_week_plans(user_id: str, role: str, patient_id: int) -> list[dict[str, Any]]:
     plans = db.fetch_week_plans_for_user(user_id, role, patient_id)
-    return [
-        {
-            "week_start": row[0],
-            "planned_km": row[1],
-            "planned_hours": row[2],
-            "phase": row[3],
-            "notes": row[4],
-        }
-        for row in plans
-    ]
+    return [dict(zip(_PLAN_KEYS, row)) for row in plans]
 
 
 def upsert_week_plan(
@@ -74,51 +67,107 @@ def upsert_week_plan(
     db.upsert_week_plan_for_user(user_id, role, patient_id, week_start, planned_km, planned_hours, phase, notes)
 
 
-def weekly_plan_vs_actual(user_id: str, role: str, patient_id: int) -> pd.DataFrame:
-    rides_df = pd.DataFrame(
-        db.fetch_rides_for_user(user_id, role, patient_id),
-        columns=["ride_date", "distance_km", "duration_min", "rpe", "notes"],
-    )
-    plan_df = pd.DataFrame(
-        db.fetch_week_plans_for_user(user_id, role, patient_id),
-        columns=["week_start", "planned_km", "planned_hours", "phase", "notes"],
-    )
-    if not plan_df.empty:
-        plan_df["week_start"] = pd.to_datetime(plan_df["week_start"], errors="coerce").dt.normalize()
+_PLAN_DTYPE = np.dtype([
+    ("week_start", "datetime64[us]"),
+    ("planned_km", "f8"),
+    ("planned_hours", "f8"),
+    ("phase", "O"),
+    ("notes", "O"),
+])
+_WEEKLY_ACTUAL_DTYPE = np.dtype([
+    ("week_start", "datetime64[us]"),
+    ("actual_km", "f8"),
+    ("actual_hours", "f8"),
+    ("rides_count", "i8"),
+])
 
-    weekly_actual = rides_to_weekly_summary(rides_df)
-    if not weekly_actual.empty:
-        weekly_actual["week_start"] = pd.to_datetime(weekly_actual["week_start"], errors="coerce").dt.normalize()
-    else:
-        weekly_actual = pd.DataFrame(columns=["week_start", "actual_km", "actual_hours", "rides_count"])
-        weekly_actual["week_start"] = pd.to_datetime(weekly_actual["week_start"])
 
-    if plan_df.empty and weekly_actual.empty:
+def weekly_plan_vs_actual(user_id: str, role: str, patient_id: int) -> pd.DataFrame:
+    plan_rows = db.fetch_week_plans_for_user(user_id, role, patient_id)
+    actual_rows = db.fetch_weekly_summary_for_user(user_id, role, patient_id)
+    if not plan_rows and not actual_rows:
         return pd.DataFrame()
 
+    # Typed record arrays give datetime/float columns up front; no to_datetime/to_numeric passes.
+    plan_df = pd.DataFrame(np.array(plan_rows, dtype=_PLAN_DTYPE))
+    weekly_actual = pd.DataFrame(np.array(actual_rows, dtype=_WEEKLY_ACTUAL_DTYPE))
+
     if plan_df.empty:
-        merged = weekly_actual.copy()
+        merged = weekly_actual
     elif weekly_actual.empty:
-        merged = plan_df.copy()
+        merged = plan_df
     else:
         merged = pd.merge(plan_df, weekly_actual, on="week_start", how="outer").sort_values("week_start")
 
-    for c in ["planned_km", "planned_hours", "actual_km", "actual_hours", "rides_count"]:
-        if c in merged.columns:
-            merged[c] = pd.to_numeric(merged[c], errors="coerce").fillna(0)
+    num_cols = [
+        c for c in ["planned_km", "planned_hours", "actual_km", "actual_hours", "rides_count"]
+        if c in merged.columns
+    ]
+    merged[num_cols] = merged[num_cols].fillna(0)
 
     if "planned_km" in merged.columns and "actual_km" in merged.columns:
-        merged["km_variance"] = merged["actual_km"] - merged["planned_km"]
-    if "planned_hours" in merged.columns and "actual_hours" in merged.columns:
-        merged["hours_variance"] = merged["actual_hours"] - merged["planned_hours"]
+        merged[["km_variance", "hours_variance"]] = (
+            merged[["actual_km", "actual_hours"]].to_numpy()
+            - merged[["planned_km", "planned_hours"]].to_numpy()
+        )
 
     return merged
 
 
+# (user_id, role, patient_id) -> (monotonic deadline, (access, refresh, expires_at, athlete_id, scope)).
+# Entries live until 2 min before token expiry, capped so token changes are picked up quickly.
+# Threadpool workers share it, so every access goes through _TOKEN_CACHE_LOCK.
+_TOKEN_CACHE: dict[tuple[str, str, int], tuple[float, tuple]] = {}
+_TOKEN_CACHE_MAX_TTL = 300.0
+_TOKEN_CACHE_LOCK = threading.Lock()
+
+
+def _invalidate_strava_tokens(patient_id: int) -> None:
+    with _TOKEN_CACHE_LOCK:
+        for key in [k for k in _TOKEN_CACHE if k[2] == int(patient_id)]:
+            del _TOKEN_CACHE[key]
+
+
+def _cache_strava_tokens(key: tuple[str, str, int], tokens: tuple) -> None:
+    ttl = min(float(tokens[2]) - time.time() - 120, _TOKEN_CACHE_MAX_TTL)
+    with _TOKEN_CACHE_LOCK:
+        if ttl > 0:
+            _TOKEN_CACHE[key] = (time.monotonic() + ttl, tokens)
+        else:
+            _TOKEN_CACHE.pop(key, None)
+
+
+def _fresh_strava_tokens(user_id: str, role: str, patient_id: int, force: bool = False) -> Optional[tuple]:
+    key = (user_id, role, int(patient_id))
+    if not force:
+        with _TOKEN_CACHE_LOCK:
+            hit = _TOKEN_CACHE.get(key)
+        if hit is not None and time.monotonic() < hit[0]:
+            # Access can be revoked while an entry is cached, so re-check it on every hit.
+            db.assert_patient_access_for_user(user_id, role, patient_id)
+            return hit[1]
+
+    token_row = db.get_strava_tokens_for_user(user_id, role, patient_id)
+    if token_row is None:
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE.pop(key, None)
+        return None
+
+    access_token, refresh_token, expires_at, athlete_id, scope, refreshed = ensure_fresh_token(token_row, force=force)
+    if refreshed:
+        db.save_strava_tokens_for_user(user_id, role, patient_id, access_token, refresh_token, expires_at, athlete_id, str(scope))
+        _invalidate_strava_tokens(patient_id)
+
+    tokens = (access_token, refresh_token, expires_at, athlete_id, scope)
+    _cache_strava_tokens(key, tokens)
+    return tokens
+
+
 def connect_strava(user_id: str, role: str, patient_id: int, code: str, state: str) -> None:
     if str(state) != str(patient_id):
         raise ValueError("Strava callback state did not match patient.")
     data = exchange_code_for_token(code)
+    athlete_id = data.get("athlete", {}).get("id")
     db.save_strava_tokens_for_user(
         user_id,
         role,
@@ -126,14 +175,19 @@ def connect_strava(user_id: str, role: str, patient_id: int, code: str, state: s
         data["access_token"],
         data["refresh_token"],
         int(data["expires_at"]),
-        data.get("athlete", {}).get("id"),
+        athlete_id,
         str(data.get("scope")),
     )
+    _invalidate_strava_tokens(patient_id)
+    _cache_strava_tokens(
+        (user_id, role, int(patient_id)),
+        (data["access_token"], data["refresh_token"], int(data["expires_at"]), athlete_id, str(data.get("scope"))),
+    )
 
 
 def get_strava_status(user_id: str, role: str, patient_id: int) -> StravaStatus:
-    token_row = db.get_strava_tokens_for_user(user_id, role, patient_id)
-    if token_row is None:
+    tokens = _fresh_strava_tokens(user_id, role, patient_id)
+    if tokens is None:
         return StravaStatus(
             connected=False,
             auth_url=build_auth_url(state=str(patient_id)),
@@ -142,10 +196,7 @@ def get_strava_status(user_id: str, role: str, patient_id: int) -> StravaStatus:
             expires_at=None,
         )
 
-    access_token, refresh_token, expires_at, athlete_id, scope, refreshed = ensure_fresh_token(token_row)
-    if refreshed:
-        db.save_strava_tokens_for_user(user_id, role, patient_id, access_token, refresh_token, expires_at, athlete_id, str(scope))
-
+    _, _, expires_at, athlete_id, scope = tokens
     return StravaStatus(
         connected=True,
         auth_url=None,
@@ -155,82 +206,82 @@ def get_strava_status(user_id: str, role: str, patient_id: int) -> StravaStatus:
     )
 
 
+_RIDE_SPORTS = frozenset({"Ride", "VirtualRide", "EBikeRide", "GravelRide", "MountainBikeRide"})
+_STRAVA_ACTIVITY_COLS = ["id", "sport_type", "type", "start_date_local", "distance", "elapsed_time", "name"]
+
+
 def sync_strava_rides(user_id: str, role: str, patient_id: int, days_back: int) -> int:
-    token_row = db.get_strava_tokens_for_user(user_id, role, patient_id)
-    if token_row is None:
+    tokens = _fresh_strava_tokens(user_id, role, patient_id)
+    if tokens is None:
         raise ValueError("Strava not connected.")
-
-    access_token, refresh_token, expires_at, athlete_id, scope, refreshed = ensure_fresh_token(token_row)
-    if refreshed:
-        db.save_strava_tokens_for_user(user_id, role, patient_id, access_token, refresh_token, expires_at, athlete_id, str(scope))
+    access_token = tokens[0]
 
     after_epoch = int(pd.Timestamp.utcnow().timestamp() - int(days_back) * 86400)
-    imported = 0
-    page = 1
-
-    while True:
-        acts = list_activities(access_token, after_epoch=after_epoch, per_page=50, page=page)
-        if not acts:
-            break
-
-        for activity in acts:
-            sport = activity.get("sport_type") or activity.get("type")
-            if sport not in ["Ride", "VirtualRide", "EBikeRide", "GravelRide", "MountainBikeRide"]:
-                continue
-
-            act_id = int(activity["id"])
-            if db.is_activity_synced_for_user(user_id, role, patient_id, act_id):
-                continue
-
-            ride_date_str = activity["start_date_local"][:10]
-            distance_km_val = float(activity.get("distance", 0)) / 1000.0
-            duration_min_val = int(round(float(activity.get("elapsed_time", 0)) / 60.0))
-            name = activity.get("name", "Strava ride")
-
-            db.add_ride_for_user(
-                user_id,
-                role,
-                patient_id,
-                ride_date_str,
-                distance_km_val,
-                duration_min_val,
-                None,
-                f"[Strava] {name}",
-            )
-            db.mark_activity_synced_for_user(user_id, role, patient_id, act_id)
-            imported += 1
-
-        page += 1
+    # Hour-aligned so repeat syncs hit Strava's ETag cache; overlap is deduped below.
+    after_epoch -= after_epoch % 3600
+    try:
+        acts = list_activities_all(access_token, after_epoch=after_epoch)
+    except requests.HTTPError as exc:
+        if exc.response is None or exc.response.status_code != 401:
+            raise
+        # Token revoked or rotated elsewhere: force one refresh and retry.
+        tokens = _fresh_strava_tokens(user_id, role, patient_id, force=True)
+        if tokens is None:
+            raise ValueError("Strava not connected.")
+        acts = list_activities_all(tokens[0], after_epoch=after_epoch)
+    if not acts:
+        return 0
+
+    df = pd.DataFrame(acts, columns=_STRAVA_ACTIVITY_COLS)
+    df["id"] = df["id"].astype("i8")
+    sport = df["sport_type"].mask(df["sport_type"].isna() | (df["sport_type"] == ""), df["type"])
+    unsynced = db.filter_unsynced_for_user(user_id, role, patient_id, df["id"].tolist())
+    # Strava pages can overlap; never import the same activity twice in one sync.
+    df = df[sport.isin(_RIDE_SPORTS) & df["id"].isin(unsynced)].drop_duplicates("id")
+    if df.empty:
+        return 0
+
+    ride_dates = df["start_date_local"].str[:10]
+    distance_km = df["distance"].fillna(0).astype("f8") / 1000.0
+    duration_min = (df["elapsed_time"].fillna(0).astype("f8") / 60.0).round().astype("i8")
+    notes = "[Strava] " + df["name"].fillna("Strava ride").astype(str)
+
+    new_rides = list(zip(
+        ride_dates.tolist(), distance_km.tolist(), duration_min.tolist(), [None] * len(df), notes.tolist(),
+    ))
+    new_ids = df["id"].tolist()
+
+    db.bulk_add_synced_rides_for_user(user_id, role, patient_id, new_rides, new_ids)
+    imported = len(new_ids)
 
     return imported
 
 
+_ISO_TOKENS = ("isometric", "wall sit", "plank")
+_IMPL_STYLE = {
+    "dumbbell": "db_kb",
+    "kettlebell": "db_kb",
+    "band": "db_kb",
+    "barbell": "barbell",
+    "bodyweight": "bodyweight",
+}
+
+
 def _parse_exercise_style(ex_row) -> str:
     if not ex_row:
         return "unknown"
 
     _, name, category, laterality, implement, _, notes = ex_row
-    name_l = (name or "").lower()
-    cat = (category or "").lower()
-    impl = (implement or "").lower()
-    nts = (notes or "").lower()
+    name_l = name.lower() if name else ""
 
-    if "isometric" in name_l or "isometric" in nts or "wall sit" in name_l or "plank" in name_l:
+    if any(tok in name_l for tok in _ISO_TOKENS) or (notes and "isometric" in notes.lower()):
         return "isometric"
 
-    if cat == "conditioning" or "bike erg" in name_l or "erg" in name_l:
+    # "erg" also covers "bike erg".
+    if (category and category.lower() == "conditioning") or "erg" in name_l:
         return "conditioning"
 
-    if impl in ["dumbbell", "kettlebell", "band"]:
-        return "db_kb"
-
-    if impl in ["barbell"]:
-        return "barbell"
-
-    if impl in ["bodyweight"]:
-        return "bodyweight"
-
-    return "generic"
+    return _IMPL_STYLE.get(implement.lower() if implement else "", "generic")
 
 
 def _suggest_progression(
@@ -306,43 +357,36 @@ def create_sc_block(
         sessions_per_week=int(sessions_per_week),
     )
 
+    unique_ids = {
+        int(r["exercise_id"]) for r in template_a + template_b if r.get("exercise_id") is not None
+    }
+    ex_rows = db.get_exercises_bulk(unique_ids)
+    style_by_id = {eid: _parse_exercise_style(ex_rows.get(eid)) for eid in unique_ids}
+    pending: list[tuple] = []
+
+    labels = ["A"] if int(sessions_per_week) == 1 else ["A", "B"]
+    deload_wk = int(deload_week)
+
+    wk_start_d = date.fromisoformat(start_date)
+    week_td = timedelta(days=7)
+    week_rows = []
     for wk in range(1, int(weeks) + 1):
-        wk_start = (date.fromisoformat(start_date) + timedelta(days=(wk - 1) * 7)).isoformat()
-        is_deload = wk == int(deload_week)
-        focus = "deload" if is_deload else goal
-
-        week_id = db.upsert_sc_week_for_user(
-            user_id=user_id,
-            role=role,
-            block_id=block_id,
-            week_no=wk,
-            week_start=wk_start,
-            focus=focus,
-            deload_flag=is_deload,
-            notes=None,
-        )
+        is_deload = wk == deload_wk
+        week_rows.append((wk, wk_start_d.isoformat(), "deload" if is_deload else goal, is_deload, labels))
+        wk_start_d += week_td
 
-        labels = ["A"] if int(sessions_per_week) == 1 else ["A", "B"]
+    session_ids = db.create_sc_block_weeks_and_sessions_for_user(user_id, role, block_id, week_rows)
 
+    for wk, _, _, is_deload, _ in week_rows:
         for lab in labels:
-            sess_id = db.upsert_sc_session_for_user(
-                user_id=user_id,
-                role=role,
-                week_id=week_id,
-                session_label=lab,
-                day_hint=None,
-                notes=None,
-            )
-            db.clear_sc_session_exercises_for_user(user_id, role, sess_id)
-
+            sess_id = session_ids[(wk, lab)]
             tpl = template_a if lab == "A" else template_b
 
             for row in tpl:
                 exercise_id = row.get("exercise_id")
                 if exercise_id is None:
                     continue
-                ex_row = db.get_exercise(int(exercise_id))
-                style = _parse_exercise_style(ex_row)
+                style = style_by_id[int(exercise_id)]
 
                 sets_t, reps_t, load_t, pct_t = _suggest_progression(
                     style=style,
@@ -354,21 +398,12 @@ def create_sc_block(
                     pct_base=row.get("pct"),
                 )
 
-                db.add_sc_session_exercise_for_user(
-                    user_id=user_id,
-                    role=role,
-                    session_id=sess_id,
-                    exercise_id=int(exercise_id),
-                    sets_target=int(sets_t),
-                    reps_target=int(reps_t),
-                    pct_1rm_target=pct_t,
-                    load_kg_target=load_t,
-                    rpe_target=None,
-                    rest_sec_target=None,
-                    intent=None,
-                    notes=f"Auto-suggest ({style})",
-                )
+                pending.append((
+                    sess_id, int(exercise_id), int(sets_t), int(reps_t), pct_t, load_t,
+                    None, None, None, f"Auto-suggest ({style})",
+                ))
 
+    db.bulk_add_sc_session_exercises_for_user(user_id, role, pending)
     return block_id
 
 
@@ -381,53 +416,35 @@ def latest_sc_block_with_detail(user_id: str, role: str, patient_id: int) -> Opt
     detail = db.fetch_sc_block_detail_for_user(user_id, role, block_id)
 
     sessions = []
-    for (wk_no, wk_start, focus, is_deload, label, day_hint, exs) in detail:
-        exercises = []
-        for ex in exs:
-            (
-                row_id,
-                ex_name,
-                sets_t,
-                reps_t,
-                pct_t,
-                load_t,
-                rpe_t,
-                rest_t,
-                intent,
-                n_notes,
-                sets_a,
-                reps_a,
-                load_a,
-                completed,
-                a_notes,
-            ) = ex
-            exercises.append(
-                {
-                    "row_id": row_id,
-                    "exercise_name": ex_name,
-                    "sets_target": sets_t,
-                    "reps_target": reps_t,
-                    "pct_1rm_target": pct_t,
-                    "load_kg_target": load_t,
-                    "rpe_target": rpe_t,
-                    "rest_sec_target": rest_t,
-                    "intent": intent,
-                    "notes": n_notes,
-                    "sets_actual": sets_a,
-                    "reps_actual": reps_a,
-                    "load_kg_actual": load_a,
-                    "completed": completed,
-                    "actual_notes": a_notes,
-                }
-            )
+    for sess in detail:
+        exercises = [
+            {
+                "row_id": ex.row_id,
+                "exercise_name": ex.exercise_name,
+                "sets_target": ex.sets_target,
+                "reps_target": ex.reps_target,
+                "pct_1rm_target": ex.pct_1rm_target,
+                "load_kg_target": ex.load_kg_target,
+                "rpe_target": ex.rpe_target,
+                "rest_sec_target": ex.rest_sec_target,
+                "intent": ex.intent,
+                "notes": ex.notes,
+                "sets_actual": ex.sets_actual,
+                "reps_actual": ex.reps_actual,
+                "load_kg_actual": ex.load_kg_actual,
+                "completed": ex.completed_flag,
+                "actual_notes": ex.actual_notes,
+            }
+            for ex in sess.exercises
+        ]
         sessions.append(
             {
-                "week_no": wk_no,
-                "week_start": wk_start,
-                "focus": focus,
-                "is_deload": is_deload,
-                "session_label": label,
-                "day_hint": day_hint,
+                "week_no": sess.week_no,
+                "week_start": sess.week_start,
+                "focus": sess.focus,
+                "is_deload": sess.deload_flag,
+                "session_label": sess.session_label,
+                "day_hint": sess.day_hint,
                 "exercises": exercises,
             }
         )
@@ -1,7 +1,24 @@
+import hashlib
+import math
+import socket
+import threading
 import time
-from urllib.parse import urlencode
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Hashable, Mapping, Optional, Tuple
+from urllib.parse import quote_plus, urlencode
+
+try:
+    # orjson parses the bytes body directly and is several times faster on activity pages.
+    from orjson import loads as _loads
+except ImportError:
+    from json import loads as _loads
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 
 from config import STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_REDIRECT_URI
 
@@ -9,6 +26,129 @@ AUTH_URL = "https://www.strava.com/oauth/authorize"
 TOKEN_URL = "https://www.strava.com/api/v3/oauth/token"
 ACTIVITIES_URL = "https://www.strava.com/api/v3/athlete/activities"
 
+class _KeepAliveAdapter(HTTPAdapter):
+    """urllib3 already disables Nagle (TCP_NODELAY); also enable SO_KEEPALIVE on pooled sockets."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+_STATIC_HEADERS = {
+    "Accept": "application/json",
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+    "User-Agent": "ride-log-app/1.0",
+}
+
+def _new_session(retry: Retry, pool_maxsize: int) -> requests.Session:
+    session = requests.Session()
+    session.mount("https://", _KeepAliveAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry))
+    # Static headers live on the session; per-call requests add only Authorization.
+    session.headers.update(_STATIC_HEADERS)
+    return session
+
+# One keep-alive session so token calls and paged activity fetches reuse the TLS connection.
+# Built at import (serialised by the import lock) and shared by every worker thread.
+# Refresh POSTs and activity GETs back off (with jitter, so parallel page fetches don't
+# retry in lockstep) on transient 5xx. 429 is not retried: Strava's window is 15 minutes,
+# so it surfaces at once as StravaRateLimited instead of holding a worker through Retry-After.
+_session = _new_session(
+    Retry(
+        total=5,
+        backoff_factor=0.4,
+        backoff_jitter=0.3,
+        status_forcelist=[500, 502, 503, 504],
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    ),
+    pool_maxsize=32,
+)
+# Authorization codes are single-use: once a POST has reached Strava, a retry can only
+# fail with 400. The code exchange therefore only retries connection failures.
+_code_session = _new_session(
+    Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.4, raise_on_status=False),
+    pool_maxsize=4,
+)
+
+class StravaRateLimited(requests.HTTPError):
+    """
+    Strava answered 429, or the shared request bucket is exhausted (no response).
+    retry_after is Strava's Retry-After, or the bucket's wait, in seconds, if known.
+    """
+
+    def __init__(self, response: Optional[requests.Response] = None, retry_after: Optional[int] = None):
+        super().__init__("Strava rate limit exceeded", response=response)
+        if retry_after is None and response is not None:
+            header = response.headers.get("Retry-After", "")
+            retry_after = int(header) if header.isdigit() else None
+        self.retry_after: Optional[int] = retry_after
+
+class StravaInvalidGrant(ValueError):
+    """Strava rejected the refresh token (revoked or superseded); the athlete must reconnect."""
+
+def _is_invalid_grant(r: requests.Response) -> bool:
+    if r.status_code not in (400, 401):
+        return False
+    try:
+        body = _loads(r.content)
+    except ValueError:
+        return False
+    if not isinstance(body, dict):
+        return False
+    if body.get("error") == "invalid_grant":
+        return True
+    return any(
+        isinstance(e, dict) and (e.get("code") == "invalid_grant" or e.get("field") == "refresh_token")
+        for e in body.get("errors") or []
+    )
+
+def _raise_for_status(r: requests.Response) -> None:
+    if r.status_code == 429:
+        raise StravaRateLimited(r)
+    r.raise_for_status()
+
+class TokenBucket:
+    """Thread-safe token bucket: refills `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Take one token, sleeping until it is available. With max_wait, give up instead of
+        sleeping longer than that: nothing is taken and the needed wait is returned.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+            if max_wait is not None and wait > max_wait:
+                return wait
+            # Reserve the token now (possibly going negative) and sleep outside the lock.
+            self._tokens -= 1
+        if wait:
+            time.sleep(wait)
+        return None
+
+# Strava's app-wide limit is 100 requests per 15 minutes. Every token POST and activity
+# GET draws from this one bucket. Interactive calls wait at most _INTERACTIVE_MAX_WAIT_SEC
+# and then raise StravaRateLimited; batch callers (fetch_many) pass max_wait=None and block.
+_STRAVA_BUCKET = TokenBucket(rate=100 / 900, burst=10)
+_INTERACTIVE_MAX_WAIT_SEC = 10.0
+
+def _take_strava_slot(max_wait: Optional[float]) -> None:
+    wait = _STRAVA_BUCKET.acquire(max_wait)
+    if wait is not None:
+        raise StravaRateLimited(retry_after=math.ceil(wait))
+
 def _require_strava_config() -> None:
     missing = []
     if not STRAVA_CLIENT_ID:
@@ -20,7 +160,9 @@ def _require_strava_config() -> None:
     if missing:
         raise ValueError(f"Missing Strava configuration: {', '.join(missing)}")
 
-def build_auth_url(state: str, scope: str = "activity:read_all") -> str:
+@lru_cache(maxsize=4)
+def _auth_prefix(scope: str) -> str:
+    # Config is checked here, so it runs once per scope; failures are not cached.
     _require_strava_config()
     params = {
         "client_id": STRAVA_CLIENT_ID,
@@ -28,39 +170,118 @@ def build_auth_url(state: str, scope: str = "activity:read_all") -> str:
         "response_type": "code",
         "approval_prompt": "auto",
         "scope": scope,
-        "state": state,
     }
     return f"{AUTH_URL}?{urlencode(params)}"
 
-def exchange_code_for_token(code: str) -> dict:
-    _require_strava_config()
-    r = requests.post(TOKEN_URL, data={
-        "client_id": STRAVA_CLIENT_ID,
-        "client_secret": STRAVA_CLIENT_SECRET,
-        "code": code,
-        "grant_type": "authorization_code",
-    }, timeout=20)
-    r.raise_for_status()
-    return r.json()
+def build_auth_url(state: str, scope: str = "activity:read_all") -> str:
+    return f"{_auth_prefix(scope)}&state={quote_plus(state)}"
+
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
 
-def refresh_access_token(refresh_token: str) -> dict:
+@lru_cache(maxsize=2)
+def _token_body_prefix(grant_type: str) -> bytes:
+    # The client credentials never change, so their form encoding is built once per grant type.
     _require_strava_config()
-    r = requests.post(TOKEN_URL, data={
+    return urlencode({
         "client_id": STRAVA_CLIENT_ID,
         "client_secret": STRAVA_CLIENT_SECRET,
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-    }, timeout=20)
-    r.raise_for_status()
-    return r.json()
+        "grant_type": grant_type,
+    }).encode()
 
-def ensure_fresh_token(token_row):
-    access_token, refresh_token, expires_at, athlete_id, scope = token_row
-    now = int(time.time())
-    if expires_at and now < int(expires_at) - 120:
-        return access_token, refresh_token, int(expires_at), athlete_id, scope, False
+# Strava codes and refresh tokens are 40 hex chars; anything this short is a bug or a
+# corrupted row, so reject it locally instead of spending a round trip and quota.
+_MIN_OAUTH_VALUE_LEN = 10
+
+def exchange_code_for_token(code: str) -> dict:
+    if not code or len(code) < _MIN_OAUTH_VALUE_LEN:
+        raise ValueError("Invalid Strava authorization code.")
+    body = _token_body_prefix("authorization_code") + b"&code=" + quote_plus(code).encode()
+    _take_strava_slot(_INTERACTIVE_MAX_WAIT_SEC)
+    r = _code_session.post(TOKEN_URL, data=body, headers=_FORM_HEADERS, timeout=20)
+    _raise_for_status(r)
+    return _loads(r.content)
+
+# refresh_token -> Future of the in-flight refresh, so concurrent callers share one POST.
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+# sha256(refresh_token) -> (monotonic time, response) of a just-finished refresh, so retry
+# loops that re-present the old token within the window don't hit Strava again. Forced
+# refreshes skip it: they follow a 401, so the cached access token is the rejected one.
+_recent_refresh: Dict[str, Tuple[float, dict]] = {}
+_REFRESH_DEBOUNCE_SEC = 5.0
+# sha256(refresh_token) -> monotonic deadline for tokens Strava just rejected, so
+# retries fail locally instead of re-posting a dead token.
+_DEAD_TOKENS: Dict[str, float] = {}
+_DEAD_TOKEN_TTL_SEC = 60.0
+
+def refresh_access_token(
+    refresh_token: str,
+    force: bool = False,
+    max_wait: Optional[float] = _INTERACTIVE_MAX_WAIT_SEC,
+) -> dict:
+    if not refresh_token or len(refresh_token) < _MIN_OAUTH_VALUE_LEN:
+        raise ValueError("Invalid Strava refresh token.")
+    token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
+    with _inflight_lock:
+        dead_until = _DEAD_TOKENS.get(token_hash)
+        if dead_until is not None and time.monotonic() < dead_until:
+            raise StravaInvalidGrant("Strava authorization was revoked; reconnect Strava.")
+        recent = None if force else _recent_refresh.get(token_hash)
+        if recent is not None and time.monotonic() - recent[0] < _REFRESH_DEBOUNCE_SEC:
+            return recent[1]
+        fut = _inflight.get(refresh_token)
+        owner = fut is None
+        if owner:
+            fut = _inflight[refresh_token] = Future()
+    if not owner:
+        # No timeout: the owner always resolves the future, and its POST is bounded by the
+        # session's timeout and Retry. A shorter wait would fail a refresh that may still succeed.
+        return fut.result()
+
+    try:
+        body = _token_body_prefix("refresh_token") + b"&refresh_token=" + quote_plus(refresh_token).encode()
+        _take_strava_slot(max_wait)
+        r = _session.post(TOKEN_URL, data=body, headers=_FORM_HEADERS, timeout=20)
+        if _is_invalid_grant(r):
+            now = time.monotonic()
+            with _inflight_lock:
+                for h in [k for k, v in _DEAD_TOKENS.items() if v <= now]:
+                    del _DEAD_TOKENS[h]
+                _DEAD_TOKENS[token_hash] = now + _DEAD_TOKEN_TTL_SEC
+            raise StravaInvalidGrant("Strava authorization was revoked; reconnect Strava.")
+        _raise_for_status(r)
+        data = _loads(r.content)
+    except BaseException as exc:
+        fut.set_exception(exc)
+        raise
+    else:
+        fut.set_result(data)
+        now = time.monotonic()
+        with _inflight_lock:
+            for h in [k for k, v in _recent_refresh.items() if now - v[0] >= _REFRESH_DEBOUNCE_SEC]:
+                del _recent_refresh[h]
+            _recent_refresh[token_hash] = (now, data)
+        return data
+    finally:
+        with _inflight_lock:
+            _inflight.pop(refresh_token, None)
+
+def ensure_fresh_token(
+    token_row,
+    force: bool = False,
+    now: Optional[int] = None,
+    max_wait: Optional[float] = _INTERACTIVE_MAX_WAIT_SEC,
+):
+    # token_row is the strava_tokens row. Tables created before STRICT keep plain INTEGER
+    # affinity, which doesn't guarantee an int, so expires_at is still cast.
+    # Batch callers may pass one `now` (epoch seconds) for every row.
+    if now is None:
+        now = int(time.time())
+    expires_at = token_row[2]
+    if not force and expires_at and now < int(expires_at) - 120:
+        return (token_row[0], token_row[1], int(expires_at), token_row[3], token_row[4], False)
 
-    data = refresh_access_token(refresh_token)
+    data = refresh_access_token(token_row[1], force=force, max_wait=max_wait)
     return (
         data["access_token"],
         data["refresh_token"],
@@ -70,9 +291,136 @@ def ensure_fresh_token(token_row):
         True
     )
 
+# (sha256(Authorization header), after_epoch, per_page, page) -> (monotonic deadline, ETag, activities).
+# Lets a re-sync send If-None-Match and reuse the parsed page on 304 Not Modified.
+# Pages are stored as tuples and handed out as fresh lists, so callers can't mutate the cache.
+# A page holds up to 200 decoded activities, so only a handful are kept.
+_ETAG_CACHE: Dict[tuple, Tuple[float, str, tuple]] = {}
+_ETAG_CACHE_TTL_SEC = 900.0
+_ETAG_CACHE_MAX = 32
+_etag_lock = threading.Lock()
+
+def _auth_headers(access_token: str) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
 def list_activities(access_token: str, after_epoch: int, per_page: int = 50, page: int = 1):
-    headers = {"Authorization": f"Bearer {access_token}"}
+    return list_activities_paged(_auth_headers(access_token), after_epoch, per_page, page)
+
+def list_activities_paged(
+    auth_headers: dict,
+    after_epoch: int,
+    per_page: int,
+    page: int,
+    max_wait: Optional[float] = _INTERACTIVE_MAX_WAIT_SEC,
+):
+    """
+    One page of activities using a caller-built (and shared, never mutated) auth header dict.
+    The GET draws from the shared rate-limit bucket, waiting at most max_wait (None: block).
+    """
     params = {"after": after_epoch, "per_page": per_page, "page": page}
-    r = requests.get(ACTIVITIES_URL, headers=headers, params=params, timeout=20)
-    r.raise_for_status()
-    return r.json()
+    auth_hash = hashlib.sha256(auth_headers["Authorization"].encode()).digest()
+    key = (auth_hash, after_epoch, per_page, page)
+    hit = _ETAG_CACHE.get(key)
+    if hit is not None and time.monotonic() < hit[0]:
+        headers = {**auth_headers, "If-None-Match": hit[1]}
+    else:
+        hit = None
+        headers = auth_headers
+    _take_strava_slot(max_wait)
+    r = _session.get(ACTIVITIES_URL, headers=headers, params=params, timeout=20)
+    if r.status_code == 304 and hit is not None:
+        return list(hit[2])
+    _raise_for_status(r)
+    acts = _loads(r.content)
+    etag = r.headers.get("ETag")
+    if etag:
+        with _etag_lock:
+            if key not in _ETAG_CACHE and len(_ETAG_CACHE) >= _ETAG_CACHE_MAX:
+                _ETAG_CACHE.pop(next(iter(_ETAG_CACHE)))
+            _ETAG_CACHE[key] = (time.monotonic() + _ETAG_CACHE_TTL_SEC, etag, tuple(acts))
+    return acts
+
+def list_activities_all(access_token: str, after_epoch: int, per_page: int = 200, prefetch: int = 4) -> list:
+    """
+    All activities after after_epoch. Page 1 is fetched alone (most syncs fit in it);
+    later pages are fetched `prefetch` at a time. Stops at the first short page;
+    results keep page order.
+    """
+    headers = _auth_headers(access_token)
+    out = list(list_activities_paged(headers, after_epoch, per_page, 1))
+    if len(out) < per_page:
+        return out
+    start = 2
+    with ThreadPoolExecutor(max_workers=prefetch) as pool:
+        while True:
+            pages = range(start, start + prefetch)
+            results = pool.map(
+                lambda p: list_activities_paged(headers, after_epoch, per_page, p),
+                pages,
+            )
+            for acts in results:
+                out.extend(acts)
+                if len(acts) < per_page:
+                    return out
+            start += prefetch
+
+
+@dataclass
+class AthleteFetch:
+    """
+    One athlete's result from fetch_many. tokens is ensure_fresh_token's tuple (its last
+    item is True when Strava issued new tokens the caller must save); error is set instead
+    of activities when the athlete's refresh or fetch failed.
+    """
+    tokens: Optional[tuple] = None
+    activities: list = field(default_factory=list)
+    error: Optional[Exception] = None
+
+def fetch_many(
+    token_rows: Mapping[Hashable, tuple],
+    after_epoch: int,
+    per_page: int = 200,
+    max_concurrency: int = 8,
+) -> Dict[Hashable, AthleteFetch]:
+    """
+    Activities after after_epoch for many athletes at once (e.g. a scheduled sync).
+    token_rows maps a caller key (e.g. patient_id) to its strava_tokens row; each row is
+    refreshed through ensure_fresh_token first. At most max_concurrency athletes are
+    fetched in parallel and every page request draws from the shared rate-limit bucket.
+    One athlete's failure is recorded on its AthleteFetch and doesn't abort the others.
+    """
+    def fetch_pages(access_token: str) -> list:
+        headers = _auth_headers(access_token)
+        out = []
+        page = 1
+        while True:
+            acts = list_activities_paged(headers, after_epoch, per_page, page, max_wait=None)
+            out.extend(acts)
+            if len(acts) < per_page:
+                return out
+            page += 1
+
+    def fetch_athlete(token_row: tuple) -> AthleteFetch:
+        result = AthleteFetch()
+        try:
+            result.tokens = ensure_fresh_token(token_row, now=now, max_wait=None)
+            try:
+                result.activities = fetch_pages(result.tokens[0])
+            except requests.HTTPError as exc:
+                if exc.response is None or exc.response.status_code != 401:
+                    raise
+                # Token revoked or rotated elsewhere: force one refresh and retry.
+                result.tokens = ensure_fresh_token(result.tokens[:5], force=True, max_wait=None)
+                result.activities = fetch_pages(result.tokens[0])
+        except Exception as exc:
+            result.error = exc
+        return result
+
+    # One expiry reference for the whole batch, so every row is judged against the same clock.
+    now = int(time.time())
+    results: Dict[Hashable, AthleteFetch] = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        futures = {pool.submit(fetch_athlete, row): key for key, row in token_rows.items()}
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results